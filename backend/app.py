@@ -1,62 +1,918 @@
 #!/usr/bin/env python3
-import os, uuid, asyncio, re, mimetypes
+import os, uuid, re, mimetypes, hashlib, shutil, unicodedata, json, subprocess, tempfile, math, time, copy, sqlite3, logging
+import importlib.util
+from collections import deque, OrderedDict
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from functools import lru_cache
 from urllib.parse import quote
-from threading import Thread, Lock
+from threading import Thread, Lock, Condition, Event, local
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait as wait_futures
 
-from flask import Flask, request, jsonify, send_from_directory, Response, make_response
+try:
+    import fcntl   # POSIX; elsewhere the run index log is appended without a lock
+except ImportError:
+    fcntl = None
+
+from flask import Flask, request, jsonify, send_file, Response, make_response
+from werkzeug.security import safe_join
+from werkzeug.wsgi import wrap_file
 from flask_cors import CORS
-import requests
-from PIL import Image
-from gtts import gTTS
 
-# Neural TTS (no API key). Falls back to gTTS.
-try:
-    import edge_tts
-    EDGE_TTS_AVAILABLE = True
-except Exception:
-    EDGE_TTS_AVAILABLE = False
+# requests, Pillow, gTTS, edge_tts, moviepy, imageio_ffmpeg and asyncio are imported where they are first
+# used (or by warm_up), so a new worker can answer /health and queue jobs right after boot.
 
-from moviepy.editor import ImageClip, AudioFileClip, concatenate_videoclips
+# Neural TTS (no API key). Falls back to gTTS.
+EDGE_TTS_AVAILABLE = importlib.util.find_spec("edge_tts") is not None
 
 # ---------- Paths ----------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DATA_DIR  = os.path.join(BASE_DIR, "data")
+DATA_DIR  = os.environ.get("STORY_DATA_DIR", os.path.join(BASE_DIR, "data"))
 IMG_DIR   = os.path.join(DATA_DIR, "images")
 AUDIO_DIR = os.path.join(DATA_DIR, "audio")
 VIDEO_DIR = os.path.join(DATA_DIR, "videos")
-for d in [DATA_DIR, IMG_DIR, AUDIO_DIR, VIDEO_DIR]:
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+RESULT_DIR = os.path.join(DATA_DIR, "results")      # finished payloads, one <run_id>.json per run
+RUN_INDEX_PATH = os.path.join(DATA_DIR, "runs_index.jsonl")
+LEGACY_RUN_INDEX_PATH = os.path.join(DATA_DIR, "runs_index.json")
+JOB_DB_PATH    = os.environ.get("STORY_JOB_DB", os.path.join(DATA_DIR, "jobs.sqlite3"))
+for d in [DATA_DIR, IMG_DIR, AUDIO_DIR, VIDEO_DIR, CACHE_DIR, RESULT_DIR]:
     os.makedirs(d, exist_ok=True)
 
+# ---------- Settings ----------
+# Max image downloads + TTS jobs running at once (shared by all runs)
+IO_CONCURRENCY = max(1, int(os.environ.get("STORY_IO_CONCURRENCY", "8")))
+# Max video renders running at once (moviepy/ffmpeg are CPU bound)
+CPU_WORKERS    = max(1, int(os.environ.get("STORY_CPU_WORKERS", str(max(1, (os.cpu_count() or 2) // 2)))))
+# Async runs processed at once, and how many may wait behind them
+JOB_WORKERS    = max(1, int(os.environ.get("STORY_JOB_WORKERS", "4")))
+JOB_QUEUE_SIZE = max(1, int(os.environ.get("STORY_JOB_QUEUE_SIZE", "32")))
+# Batch (catalog) runs get their own workers so bulk builds never starve interactive requests:
+# runs generating at once across every batch, max items per batch, and max items waiting overall
+BATCH_CONCURRENCY = max(1, int(os.environ.get("STORY_BATCH_CONCURRENCY", "2")))
+BATCH_MAX_ITEMS   = max(1, int(os.environ.get("STORY_BATCH_MAX_ITEMS", "500")))
+BATCH_QUEUE_SIZE  = max(1, int(os.environ.get("STORY_BATCH_QUEUE_SIZE", "2000")))
+# Disk budget for downloaded Pollinations images (LRU evicted past this)
+IMAGE_CACHE_MB = max(1, int(os.environ.get("STORY_IMAGE_CACHE_MB", "512")))
+# Disk budget for synthesized narration, keyed by text/voice/rate/pitch/engine
+TTS_CACHE_MB   = max(1, int(os.environ.get("STORY_TTS_CACHE_MB", "256")))
+# "moviepy" composites every frame; "ffmpeg" encodes each still once and concatenates by stream copy
+VIDEO_ENGINE   = os.environ.get("STORY_VIDEO_ENGINE", "moviepy").strip().lower()
+FAST_VIDEO_FPS = max(1, int(os.environ.get("STORY_FAST_VIDEO_FPS", "2")))
+# With the ffmpeg engine, also publish a growing HLS playlist (one segment per slide)
+HLS_ENABLED    = os.environ.get("STORY_HLS", "1") not in ("0", "false", "no")
+# Length of each HLS chunk in seconds (slides are cut into chunks of this size; also the playlist's target duration)
+HLS_SEGMENT_SECONDS = max(1, int(os.environ.get("STORY_HLS_SEGMENT", "4")))
+# Idle /api/events streams send a comment this often so proxies keep them open
+SSE_KEEPALIVE_SECONDS = max(1, int(os.environ.get("STORY_SSE_KEEPALIVE", "15")))
+# Outbound HTTP (image downloads): connect/read timeouts in seconds and retry budget
+HTTP_CONNECT_TIMEOUT = float(os.environ.get("STORY_HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT    = float(os.environ.get("STORY_HTTP_READ_TIMEOUT", "60"))
+HTTP_RETRIES         = max(0, int(os.environ.get("STORY_HTTP_RETRIES", "3")))
+# Longest sleep between retries, whether from backoff or a server's Retry-After
+HTTP_RETRY_MAX_WAIT  = max(0.0, float(os.environ.get("STORY_HTTP_RETRY_MAX_WAIT", "10")))
+# edge-tts jobs allowed to stream at once on the shared TTS event loop, and per-job timeout
+TTS_CONCURRENCY = max(1, int(os.environ.get("STORY_TTS_CONCURRENCY", "6")))
+TTS_TIMEOUT     = float(os.environ.get("STORY_TTS_TIMEOUT", "120"))
+# Where run progress/results live: "memory" (this process) or "sqlite" (shared by all workers)
+JOB_STORE_KIND  = os.environ.get("STORY_JOB_STORE", "memory").strip().lower()
+# Finished runs are dropped from the job store this many seconds after completion
+JOB_TTL_SECONDS = max(60, int(os.environ.get("STORY_JOB_TTL", "3600")))
+# A claim or unfinished run its worker has not renewed for this many seconds is dead (the worker crashed)
+CLAIM_LEASE_SECONDS = max(10, int(os.environ.get("STORY_CLAIM_LEASE", "120")))
+# Disk retention for finished runs (0 disables a policy): age in hours, total size in MB,
+# number of most recent runs always kept, and seconds between sweeps
+RETENTION_MAX_AGE_HOURS = float(os.environ.get("STORY_RETENTION_MAX_AGE_HOURS", "0"))
+RETENTION_MAX_MB        = int(os.environ.get("STORY_RETENTION_MAX_MB", "0"))
+RETENTION_KEEP_RECENT   = int(os.environ.get("STORY_RETENTION_KEEP_RECENT", "0"))
+RETENTION_INTERVAL      = max(10, int(os.environ.get("STORY_RETENTION_INTERVAL", "600")))
+# Media never changes once written under a run_id, so clients/CDNs may cache it for a year
+MEDIA_MAX_AGE   = int(os.environ.get("STORY_MEDIA_MAX_AGE", str(365 * 24 * 3600)))
+# Behind nginx/Apache, hand file bodies to the front server via X-Sendfile
+USE_X_SENDFILE  = os.environ.get("STORY_USE_X_SENDFILE", "0") in ("1", "true", "yes")
+# Story plans memoized by (prompt, slides, lang) for /api/preview and repeat requests
+PLANNER_CACHE_SIZE = max(0, int(os.environ.get("STORY_PLANNER_CACHE", "4096")))
+# Slide images: JPEG/WebP quality, and widths of the downscaled variants served by /images (smallest = thumbnail)
+IMAGE_QUALITY  = min(95, max(30, int(os.environ.get("STORY_IMAGE_QUALITY", "85"))))
+IMAGE_VARIANT_WIDTHS = sorted({int(w) for w in os.environ.get("STORY_IMAGE_WIDTHS", "640,320").split(",") if w.strip()})
+# Import the media libraries in the background when a worker starts serving, not on its first story
+WARMUP = os.environ.get("STORY_WARMUP", "0") in ("1", "true", "yes")
+# Image generation endpoint (overridable for local stand-ins)
+POLLINATIONS_BASE = os.environ.get("STORY_POLLINATIONS_URL", "https://image.pollinations.ai").rstrip("/")
+
 app = Flask(__name__)
+app.config["USE_X_SENDFILE"] = USE_X_SENDFILE
 CORS(app)
+log = logging.getLogger("story")
+
+# ======================================================
+# Metrics (Prometheus text format on /metrics)
+# ======================================================
+class Metrics:
+    """Process-wide counters and histograms, rendered in the Prometheus text exposition format."""
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+    def __init__(self):
+        self._lock = Lock()
+        self._help = {}
+        self._counters = {}     # (name, labels) -> value
+        self._histograms = {}   # (name, labels) -> [bucket counts..., sum, count]
+
+    def describe(self, name: str, kind: str, text: str):
+        self._help[name] = (kind, text)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = [0] * len(self.BUCKETS) + [0.0, 0]
+            for k, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    h[k] += 1
+            h[-2] += seconds
+            h[-1] += 1
+
+    @staticmethod
+    def _labels(labels) -> str:
+        if not labels:
+            return ""
+        esc = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in labels) + "}"
+
+    @staticmethod
+    def _value(v) -> str:
+        """Exact sample value: integers as-is, floats round-trip (no 6-digit `g` rounding)."""
+        if isinstance(v, int):
+            return str(int(v))
+        v = float(v)
+        if math.isnan(v):
+            return "NaN"
+        if math.isinf(v):
+            return "+Inf" if v > 0 else "-Inf"
+        return str(int(v)) if v.is_integer() and abs(v) < 2 ** 53 else repr(v)
+
+    def render(self, gauges=()) -> str:
+        """Text exposition of every series; `gauges` adds (name, kind, help, labels, value) samples."""
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted((k, list(v)) for k, v in self._histograms.items())
+        lines, seen = [], set()
+
+        def header(name, kind, text=None):
+            if name not in seen:
+                seen.add(name)
+                kind, text = self._help.get(name, (kind, text or name))
+                lines.extend([f"# HELP {name} {text}", f"# TYPE {name} {kind}"])
+
+        for (name, labels), value in counters:
+            header(name, "counter")
+            lines.append(f"{name}{self._labels(labels)} {self._value(value)}")
+        for (name, labels), h in histograms:
+            header(name, "histogram")
+            for bound, count in zip(self.BUCKETS, h):
+                lines.append(f"{name}_bucket{self._labels(labels + (('le', self._value(bound)),))} {count}")
+            lines.append(f"{name}_bucket{self._labels(labels + (('le', '+Inf'),))} {h[-1]}")
+            lines.append(f"{name}_sum{self._labels(labels)} {self._value(h[-2])}")
+            lines.append(f"{name}_count{self._labels(labels)} {h[-1]}")
+        # samples of one family must be contiguous; keep families in first-seen order
+        order = {}
+        for g in gauges:
+            order.setdefault(g[0], len(order))
+        for name, kind, text, labels, value in sorted(gauges, key=lambda g: order[g[0]]):
+            header(name, kind, text)
+            lines.append(f"{name}{self._labels(tuple(sorted(labels.items())))} {self._value(value)}")
+        return "\n".join(lines) + "\n"
+
+METRICS = Metrics()
+METRICS.describe("story_stage_seconds", "histogram", "Wall time of one pipeline stage (plan, image, tts, segment, concat, video, total).")
+METRICS.describe("story_stage_outcomes_total", "counter", "Stage results: success, fallback (placeholder image, gTTS) or error.")
+METRICS.describe("story_stage_bytes_total", "counter", "Bytes written by each pipeline stage.")
+METRICS.describe("story_runs_total", "counter", "Finished runs by status.")
+
+class RunMetrics:
+    """Timings, bytes and outcomes for one run. Everything recorded here also feeds METRICS."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.stages = {}     # stage -> {"count", "seconds", "max_seconds"}
+        self.outcomes = {}   # stage -> {outcome: count}
+        self.bytes = {}      # stage -> bytes
+
+    @contextmanager
+    def timed(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - t0)
+
+    def observe(self, stage: str, seconds: float):
+        METRICS.observe("story_stage_seconds", seconds, stage=stage)
+        with self._lock:
+            s = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            s["count"] += 1
+            s["seconds"] += seconds
+            s["max_seconds"] = max(s["max_seconds"], seconds)
+
+    def outcome(self, stage: str, outcome: str):
+        METRICS.inc("story_stage_outcomes_total", stage=stage, outcome=outcome)
+        with self._lock:
+            per_stage = self.outcomes.setdefault(stage, {})
+            per_stage[outcome] = per_stage.get(outcome, 0) + 1
+
+    def add_bytes(self, stage: str, path: str):
+        try:
+            n = os.path.getsize(path)
+        except OSError:
+            return
+        METRICS.inc("story_stage_bytes_total", n, stage=stage)
+        with self._lock:
+            self.bytes[stage] = self.bytes.get(stage, 0) + n
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            return {
+                "stages": {k: {"count": v["count"], "seconds": round(v["seconds"], 4),
+                               "max_seconds": round(v["max_seconds"], 4)} for k, v in self.stages.items()},
+                "outcomes": copy.deepcopy(self.outcomes),
+                "bytes": dict(self.bytes),
+            }
 
 # ======================================================
 # Progress tracking (for async generation)
 # ======================================================
-PROGRESS = {}   # run_id -> {"current":int, "total":int, "message":str, "done":bool, "error":str|None}
-RESULTS  = {}   # run_id -> final story JSON payload
-_LOCK = Lock()
+class JobStore(ABC):
+    """
+    Per-run state: progress, slides published so far, the final payload and a change counter.
+    Also the request-key index (finished runs and in-flight claims) and batch records, so
+    every worker that shares the runs shares those too.
+    Unfinished runs and claims hold a lease: every write to a run renews it, and a heartbeat
+    thread renews the runs this process owns. A worker that dies stops renewing, so its claims
+    lapse and its runs are failed once the lease runs out.
+    Subclasses only provide atomic read-modify-write of a whole record.
+    """
+    shared = False          # True when other processes see the same runs
+    EVICT_EVERY = 60.0      # seconds between TTL sweeps
 
-def _progress_init(run_id: str, total: int, message: str = "Starting"):
-    with _LOCK:
-        PROGRESS[run_id] = {
-            "current": 0, "total": max(1, total), "message": message, "done": False, "error": None
-        }
+    def __init__(self, ttl: float, lease: float = 120.0):
+        self.ttl = ttl
+        self.lease = lease
+        self._last_evict = time.monotonic()
+        self._owned = set()         # unfinished runs started in this process
+        self._owned_lock = Lock()
+        self._heartbeat = None      # (pid, Thread) while there are owned runs
 
-def _progress_step(run_id: str, step: int = 1, message: str = ""):
-    with _LOCK:
-        p = PROGRESS.get(run_id)
-        if not p: return
-        p["current"] = max(0, min(p["total"], p["current"] + step))
-        if message:
-            p["message"] = message
+    # ---- storage hooks
+    @abstractmethod
+    def _update(self, run_id: str, fn, create: bool = True) -> bool: ...
+    @abstractmethod
+    def _get(self, run_id: str) -> dict | None: ...
+    @abstractmethod
+    def delete(self, run_id: str): ...
+    @abstractmethod
+    def evict_expired(self) -> int: ...
+    @abstractmethod
+    def _unfinished(self) -> list: ...
+    # side tables ("keys", "batches"): fn(record or None) -> (new record or None to delete, return value)
+    @abstractmethod
+    def _rec_update(self, table: str, key: str, fn): ...
+    @abstractmethod
+    def _rec_get(self, table: str, key: str) -> dict | None: ...
+    @abstractmethod
+    def _rec_find(self, table: str, run_id: str) -> list: ...
 
-def _progress_done(run_id: str, error: str | None = None):
-    with _LOCK:
-        p = PROGRESS.setdefault(run_id, {"current": 1, "total": 1, "message": "Done", "done": False, "error": None})
+    @staticmethod
+    def _new_record() -> dict:
+        return {"progress": None, "result": None, "slides": {}, "seq": 0, "finished_at": None, "updated_at": None}
+
+    def _maybe_evict(self):
+        if time.monotonic() - self._last_evict >= self.EVICT_EVERY:
+            self._last_evict = time.monotonic()
+            for run_id in self._unfinished():
+                self._read(run_id)
+            self.evict_expired()
+
+    # ---- leases
+    def _stale(self, r) -> bool:
+        """An unfinished run nobody renewed within the lease."""
+        return bool(r and not r["finished_at"] and time.time() - (r.get("updated_at") or 0) >= self.lease)
+
+    def _read(self, run_id: str) -> dict | None:
+        r = self._get(run_id)
+        if self._stale(r):
+            def fn(r):
+                if not self._stale(r): return False
+                self._finish_record(r, "worker stopped before the run finished")
+            if self._update(run_id, fn, create=False):
+                log.warning("run %s: lease expired, marking it failed", run_id)
+            r = self._get(run_id)
+        return r
+
+    def renew(self, run_id: str) -> bool:
+        """Extend the lease of run_id and of its claims; False once the run is finished or gone."""
+        now = time.time()
+        def claim_fn(r):
+            if r and r["payload"] is None and r["run_id"] == run_id:
+                r["updated_at"] = now
+            return r, None
+        for key, r in self._rec_find("keys", run_id):
+            if r["payload"] is None:
+                self._rec_update("keys", key, claim_fn)
+        return self._update(run_id, lambda r: False if r["finished_at"] else None, create=False)
+
+    def _own(self, run_id: str):
+        with self._owned_lock:
+            self._owned.add(run_id)
+            hb = self._heartbeat
+            if hb is None or hb[0] != os.getpid():     # none yet, or inherited through fork
+                t = Thread(target=self._beat, name="story-lease", daemon=True)
+                self._heartbeat = (os.getpid(), t)
+                t.start()
+
+    def _disown(self, run_id: str):
+        with self._owned_lock:
+            self._owned.discard(run_id)
+
+    def _beat(self):
+        while True:
+            time.sleep(self.lease / 4)
+            with self._owned_lock:
+                if not self._owned:
+                    self._heartbeat = None
+                    return
+                runs = list(self._owned)
+            for run_id in runs:
+                try:
+                    if not self.renew(run_id):
+                        self._disown(run_id)
+                except Exception:
+                    log.exception("lease renewal failed for run %s", run_id)
+
+    # ---- writes
+    def init(self, run_id: str, total: int, message: str):
+        def fn(r):
+            r["progress"] = {"current": 0, "total": max(1, total), "message": message, "done": False, "error": None}
+            r["finished_at"] = None
+        self._update(run_id, fn)
+        self._own(run_id)
+        self._maybe_evict()
+
+    def step(self, run_id: str, step: int, message: str) -> bool:
+        def fn(r):
+            p = r["progress"]
+            if not p: return False
+            p["current"] = max(0, min(p["total"], p["current"] + step))
+            if message:
+                p["message"] = message
+        return self._update(run_id, fn, create=False)
+
+    def add_slide(self, run_id: str, slide: dict):
+        def fn(r):
+            r["slides"][str(slide["index"])] = slide
+        self._update(run_id, fn, create=False)
+
+    @staticmethod
+    def _finish_record(r: dict, error: str | None):
+        r["slides"] = {}
+        p = r["progress"] or {"current": 1, "total": 1, "message": "Done", "done": False, "error": None}
         p["done"] = True
         if error:
             p["error"] = error
+        r["progress"] = p
+        r["finished_at"] = time.time()
+
+    def done(self, run_id: str, error: str | None):
+        self._update(run_id, lambda r: self._finish_record(r, error))
+        self._disown(run_id)
+
+    def set_result(self, run_id: str, payload: dict):
+        def fn(r):
+            r["result"] = payload
+        self._update(run_id, fn)
+
+    def publish(self, run_id: str, payload: dict):
+        def fn(r):
+            r["result"] = payload
+            r["progress"] = {"current": 1, "total": 1, "message": "Done", "done": True, "error": None}
+            r["finished_at"] = time.time()
+        self._update(run_id, fn)
+
+    # ---- reads
+    def snapshot(self, run_id: str) -> dict | None:
+        """The whole record: progress, result, slides (by index) and seq."""
+        return self._read(run_id)
+
+    def progress(self, run_id: str) -> dict | None:
+        r = self._read(run_id)
+        return r["progress"] if r else None
+
+    def result(self, run_id: str) -> dict | None:
+        r = self._read(run_id)
+        return r["result"] if r else None
+
+    def slides(self, run_id: str) -> list:
+        r = self._read(run_id)
+        return sorted(r["slides"].values(), key=lambda s: s["index"]) if r else []
+
+    def seq(self, run_id: str) -> int | None:
+        r = self._read(run_id)
+        return r["seq"] if r else None
+
+    # ---- request keys: {"run_id", "claimed_at", "updated_at", "payload"}, a claim until payload is set
+    def _live_claim(self, r) -> bool:
+        return bool(r and r["payload"] is None
+                    and time.time() - (r.get("updated_at") or r["claimed_at"]) < self.lease)
+
+    def claim(self, key: str, run_id: str, usable) -> tuple:
+        """
+        ("running", other_run_id) while key is claimed, ("done", finished_run_id) when a finished
+        run passes usable(payload), else key is claimed for run_id: ("new", run_id).
+        Claims not renewed within the lease are treated as abandoned (their worker died).
+        """
+        self._maybe_evict()
+        def fn(r):
+            if self._live_claim(r):
+                return r, ("running", r["run_id"])
+            if r and r["payload"] is not None and usable(r["payload"]):
+                return r, ("done", r["run_id"])
+            now = time.time()
+            return {"run_id": run_id, "claimed_at": now, "updated_at": now, "payload": None}, ("new", run_id)
+        return self._rec_update("keys", key, fn)
+
+    def release(self, key: str, run_id: str, payload: dict | None) -> bool:
+        """Drop run_id's claim on key, recording payload as the finished run when given."""
+        def fn(r):
+            if not r or r["payload"] is not None or r["run_id"] != run_id:
+                return r, False
+            return ({"run_id": run_id, "claimed_at": None, "payload": payload} if payload else None), True
+        return self._rec_update("keys", key, fn)
+
+    def finished(self, key: str) -> dict | None:
+        r = self._rec_get("keys", key)
+        return r["payload"] if r else None
+
+    def claimant(self, key: str) -> str | None:
+        r = self._rec_get("keys", key)
+        return r["run_id"] if self._live_claim(r) else None
+
+    def claimed_by(self, run_id: str) -> bool:
+        return any(self._live_claim(r) for _, r in self._rec_find("keys", run_id))
+
+    def forget_finished(self, run_id: str):
+        """Drop finished entries that point at run_id."""
+        def fn(r):
+            if r and r["payload"] is not None and r["run_id"] == run_id:
+                return None, None
+            return r, None
+        for key, r in self._rec_find("keys", run_id):
+            if r["payload"] is not None:
+                self._rec_update("keys", key, fn)
+
+    # ---- batches
+    def put_batch(self, batch_id: str, batch: dict):
+        self._rec_update("batches", batch_id, lambda r: (batch, None))
+
+    def update_batch(self, batch_id: str, fn) -> bool:
+        def upd(b):
+            if b is None:
+                return None, False
+            fn(b)
+            return b, True
+        return self._rec_update("batches", batch_id, upd)
+
+    def batch(self, batch_id: str) -> dict | None:
+        b = self._rec_get("batches", batch_id)
+        if b and b["finished_at"] and b["finished_at"] < time.time() - self.ttl:
+            return None
+        return b
+
+@contextmanager
+def _file_lock(path: str):
+    with open(path, "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def _save_result(result_dir: str, payload: dict):
+    path = os.path.join(result_dir, f"{payload['run_id']}.json")
+    tmp = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def _load_result(result_dir: str, run_id: str) -> dict | None:
+    try:
+        with open(os.path.join(result_dir, f"{run_id}.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _index_entry(line) -> tuple | None:
+    """(key, run_id or None) from one run index log line; None for a torn or foreign line."""
+    try:
+        e = json.loads(line)
+        return e["key"], e["run_id"]
+    except (ValueError, TypeError, KeyError):
+        return None
+
+def _read_run_index(index_path: str) -> dict:
+    """key -> run_id after replaying the whole log."""
+    done = {}
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                e = _index_entry(line)
+                if e:
+                    done[e[0]] = e[1]
+    except OSError:
+        pass
+    return {k: rid for k, rid in done.items() if rid}
+
+def _migrate_run_index(legacy_path: str, index_path: str, result_dir: str):
+    """Turn the old key -> payload JSON index into result files and log lines, once."""
+    if not os.path.isfile(legacy_path):
+        return
+    with _file_lock(index_path + ".lock"):
+        if not os.path.isfile(legacy_path):
+            return
+        try:
+            with open(legacy_path, "r", encoding="utf-8") as f:
+                done = json.load(f)
+        except (OSError, ValueError):
+            done = {}
+        with open(index_path, "a", encoding="utf-8") as f:
+            for key, payload in done.items():
+                if payload.get("run_id"):
+                    _save_result(result_dir, payload)
+                    f.write(json.dumps({"key": key, "run_id": payload["run_id"]}) + "\n")
+        os.replace(legacy_path, legacy_path + ".migrated")
+
+class MemoryJobStore(JobStore):
+    """
+    Runs, claims and batches kept in this process only. A finished request key holds just its
+    run_id: the payload is read from the run's job record, or from result_dir where it is saved
+    once. Finished keys survive restarts in an append-only log (index_path, one JSON line per
+    change); lines other processes append are read from the last offset, and the log is
+    compacted once mostly superseded, dropping runs whose result file was deleted with their media.
+    """
+    COMPACT_MIN = 1024      # log lines before a compaction is considered
+
+    def __init__(self, ttl: float, index_path: str | None = None, lease: float = 120.0,
+                 result_dir: str | None = None):
+        super().__init__(ttl, lease)
+        self._lock = Lock()
+        self._runs = {}
+        self._tables = {"keys": {}, "batches": {}}   # finished keys: {"run_id"}; claims: full records
+        self.index_path = index_path
+        self.result_dir = result_dir
+        self._index_pos = (None, 0)     # (inode, offset) of the log read so far
+        self._index_lines = 0
+        with self._lock:
+            self._sync_index_locked()
+
+    def _sync_index_locked(self):
+        """Apply log lines appended since the last read; all of them after a compaction."""
+        if not self.index_path:
+            return
+        try:
+            st = os.stat(self.index_path)
+        except OSError:
+            return
+        ino, pos = self._index_pos
+        if (st.st_ino, st.st_size) == (ino, pos):
+            return
+        keys = self._tables["keys"]
+        if st.st_ino != ino:
+            for k in [k for k, r in keys.items() if "payload" not in r]:
+                del keys[k]
+            pos, self._index_lines = 0, 0
+        with open(self.index_path, "rb") as f:
+            f.seek(pos)
+            data = f.read()
+        data = data[:data.rfind(b"\n") + 1]    # a line may still be half written
+        self._index_pos = (st.st_ino, pos + len(data))
+        for line in data.splitlines():
+            e = _index_entry(line)
+            if not e:
+                continue
+            self._index_lines += 1
+            key, run_id = e
+            if "payload" in keys.get(key, ()):
+                continue                        # claims made here are left alone
+            if run_id:
+                keys[key] = {"run_id": run_id}
+            else:
+                keys.pop(key, None)
+
+    def _append_index_locked(self, key: str, run_id: str | None):
+        with _file_lock(self.index_path + ".lock"):
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"key": key, "run_id": run_id}) + "\n")
+            self._sync_index_locked()
+            finished = sum(1 for r in self._tables["keys"].values() if "payload" not in r)
+            if self._index_lines > max(self.COMPACT_MIN, 4 * finished):
+                self._compact_index_locked()
+
+    def _compact_index_locked(self):
+        keys = self._tables["keys"]
+        live = {}
+        for k, r in list(keys.items()):
+            if "payload" in r:
+                continue
+            if os.path.isfile(os.path.join(self.result_dir, f"{r['run_id']}.json")):
+                live[k] = r["run_id"]
+            else:
+                del keys[k]
+        tmp = f"{self.index_path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for k, rid in live.items():
+                f.write(json.dumps({"key": k, "run_id": rid}) + "\n")
+        os.replace(tmp, self.index_path)
+        st = os.stat(self.index_path)
+        self._index_pos, self._index_lines = (st.st_ino, st.st_size), len(live)
+
+    def _load_result_locked(self, run_id: str) -> dict | None:
+        run = self._runs.get(run_id)
+        if run and run["result"]:
+            return copy.deepcopy(run["result"])
+        return _load_result(self.result_dir, run_id) if self.result_dir else None
+
+    def _key_row_locked(self, key: str) -> dict | None:
+        """The key's record as the base class sees it, with a finished run's payload filled in."""
+        r = self._tables["keys"].get(key)
+        if r is None or "payload" in r:
+            return copy.deepcopy(r)
+        payload = self._load_result_locked(r["run_id"])
+        if payload is None:             # the run and its media were deleted
+            del self._tables["keys"][key]
+            if self.index_path:
+                self._append_index_locked(key, None)
+            return None
+        return {"run_id": r["run_id"], "claimed_at": None, "payload": payload}
+
+    def _rec_update(self, table, key, fn):
+        with self._lock:
+            rows = self._tables[table]
+            if table != "keys":
+                new, ret = fn(copy.deepcopy(rows.get(key)))
+                if new is None:
+                    rows.pop(key, None)
+                else:
+                    rows[key] = new
+                return ret
+            self._sync_index_locked()
+            old = self._key_row_locked(key)
+            new, ret = fn(copy.deepcopy(old))
+            was = old["run_id"] if old and old["payload"] is not None else None
+            now = new["run_id"] if new and new["payload"] is not None else None
+            if new is None:
+                rows.pop(key, None)
+            elif now:
+                rows[key] = {"run_id": now}
+            else:
+                rows[key] = new
+            if now != was:
+                if now and self.result_dir:
+                    _save_result(self.result_dir, new["payload"])
+                if self.index_path:
+                    self._append_index_locked(key, now)
+            return ret
+
+    def _rec_get(self, table, key):
+        with self._lock:
+            if table != "keys":
+                r = self._tables[table].get(key)
+                return copy.deepcopy(r) if r else None
+            self._sync_index_locked()
+            return self._key_row_locked(key)
+
+    def _rec_find(self, table, run_id):
+        with self._lock:
+            if table != "keys":
+                return [(k, copy.deepcopy(r)) for k, r in self._tables[table].items() if r.get("run_id") == run_id]
+            self._sync_index_locked()
+            found = [k for k, r in self._tables["keys"].items() if r.get("run_id") == run_id]
+            return [(k, r) for k, r in ((k, self._key_row_locked(k)) for k in found) if r]
+
+    def _update(self, run_id, fn, create=True):
+        with self._lock:
+            r = self._runs.get(run_id)
+            if r is None:
+                if not create: return False
+                r = self._runs[run_id] = self._new_record()
+            if fn(r) is False:
+                return False
+            r["seq"] += 1
+            r["updated_at"] = time.time()
+            return True
+
+    def _get(self, run_id):
+        with self._lock:
+            r = self._runs.get(run_id)
+            return copy.deepcopy(r) if r else None
+
+    def delete(self, run_id):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+    def _unfinished(self):
+        with self._lock:
+            return [k for k, r in self._runs.items() if not r["finished_at"]]
+
+    def evict_expired(self):
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            old = [k for k, r in self._runs.items() if r["finished_at"] and r["finished_at"] < cutoff]
+            for k in old:
+                del self._runs[k]
+            batches = self._tables["batches"]
+            for k in [k for k, b in batches.items() if b["finished_at"] and b["finished_at"] < cutoff]:
+                del batches[k]
+        return len(old)
+
+class SQLiteJobStore(JobStore):
+    """
+    Runs, request keys and batches kept in a SQLite database in WAL mode, so every worker
+    process behind the port sees them.
+    """
+    shared = True
+
+    def __init__(self, path: str, ttl: float, index_path: str | None = None, lease: float = 120.0,
+                 result_dir: str | None = None):
+        super().__init__(ttl, lease)
+        self.path = path
+        self._local = local()
+        with self._conn() as db:
+            db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                run_id      TEXT PRIMARY KEY,
+                record      TEXT NOT NULL,
+                finished_at REAL
+            )""")
+            db.execute("CREATE INDEX IF NOT EXISTS jobs_finished ON jobs(finished_at)")
+            db.execute("""CREATE TABLE IF NOT EXISTS records (
+                tbl         TEXT NOT NULL,
+                key         TEXT NOT NULL,
+                run_id      TEXT,
+                record      TEXT NOT NULL,
+                finished_at REAL,
+                PRIMARY KEY (tbl, key)
+            )""")
+            db.execute("CREATE INDEX IF NOT EXISTS records_run ON records(tbl, run_id)")
+        if index_path and result_dir and os.path.isfile(index_path):
+            self._import_index(index_path, result_dir)
+
+    def _import_index(self, index_path: str, result_dir: str):
+        """One-time import of the run index a memory store left behind."""
+        done = {}
+        for k, rid in _read_run_index(index_path).items():
+            payload = _load_result(result_dir, rid)
+            if payload:
+                done[k] = payload
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if not db.execute("SELECT 1 FROM records WHERE tbl = 'keys' LIMIT 1").fetchone():
+                db.executemany("INSERT INTO records (tbl, key, run_id, record) VALUES ('keys', ?, ?, ?)",
+                               [(k, p.get("run_id"), json.dumps({"run_id": p.get("run_id"), "claimed_at": None,
+                                                                 "payload": p}, ensure_ascii=False))
+                                for k, p in done.items()])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _conn(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def _update(self, run_id, fn, create=True):
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT record FROM jobs WHERE run_id = ?", (run_id,)).fetchone()
+            if row is None and not create:
+                db.execute("ROLLBACK")
+                return False
+            r = json.loads(row[0]) if row else self._new_record()
+            if fn(r) is False:
+                db.execute("ROLLBACK")
+                return False
+            r["seq"] += 1
+            r["updated_at"] = time.time()
+            db.execute("INSERT OR REPLACE INTO jobs (run_id, record, finished_at) VALUES (?, ?, ?)",
+                       (run_id, json.dumps(r, ensure_ascii=False), r["finished_at"]))
+            db.execute("COMMIT")
+            return True
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _get(self, run_id):
+        row = self._conn().execute("SELECT record FROM jobs WHERE run_id = ?", (run_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def delete(self, run_id):
+        self._conn().execute("DELETE FROM jobs WHERE run_id = ?", (run_id,))
+
+    def _unfinished(self):
+        return [k for (k,) in self._conn().execute("SELECT run_id FROM jobs WHERE finished_at IS NULL").fetchall()]
+
+    def evict_expired(self):
+        cutoff = time.time() - self.ttl
+        db = self._conn()
+        db.execute("DELETE FROM records WHERE tbl = 'batches' AND finished_at IS NOT NULL AND finished_at < ?", (cutoff,))
+        cur = db.execute("DELETE FROM jobs WHERE finished_at IS NOT NULL AND finished_at < ?", (cutoff,))
+        return cur.rowcount
+
+    def _rec_update(self, table, key, fn):
+        db = self._conn()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            row = db.execute("SELECT record FROM records WHERE tbl = ? AND key = ?", (table, key)).fetchone()
+            old = json.loads(row[0]) if row else None
+            new, ret = fn(old)
+            data = json.dumps(new, ensure_ascii=False) if new is not None else None
+            if data is None:
+                if row:
+                    db.execute("DELETE FROM records WHERE tbl = ? AND key = ?", (table, key))
+            elif row is None or data != row[0]:
+                db.execute("INSERT OR REPLACE INTO records (tbl, key, run_id, record, finished_at) VALUES (?, ?, ?, ?, ?)",
+                           (table, key, new.get("run_id"), data, new.get("finished_at")))
+            db.execute("COMMIT")
+            return ret
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+
+    def _rec_get(self, table, key):
+        row = self._conn().execute("SELECT record FROM records WHERE tbl = ? AND key = ?", (table, key)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _rec_find(self, table, run_id):
+        rows = self._conn().execute("SELECT key, record FROM records WHERE tbl = ? AND run_id = ?", (table, run_id))
+        return [(k, json.loads(r)) for k, r in rows.fetchall()]
+
+def _make_job_store() -> JobStore:
+    _migrate_run_index(LEGACY_RUN_INDEX_PATH, RUN_INDEX_PATH, RESULT_DIR)
+    if JOB_STORE_KIND == "sqlite":
+        return SQLiteJobStore(JOB_DB_PATH, JOB_TTL_SECONDS, RUN_INDEX_PATH, CLAIM_LEASE_SECONDS, RESULT_DIR)
+    return MemoryJobStore(JOB_TTL_SECONDS, RUN_INDEX_PATH, CLAIM_LEASE_SECONDS, RESULT_DIR)
+
+JOB_STORE = _make_job_store()
+
+# Open /api/events streams in this process wait on a per-run Condition
+_WATCH_LOCK = Lock()
+_WATCHERS = {}  # run_id -> [Condition on _WATCH_LOCK, number of open event streams, local change count]
+
+def _changed(run_id: str):
+    with _WATCH_LOCK:
+        w = _WATCHERS.get(run_id)
+        if w:
+            w[2] += 1
+            w[0].notify_all()
+
+def _progress_init(run_id: str, total: int, message: str = "Starting"):
+    JOB_STORE.init(run_id, total, message)
+    _changed(run_id)
+
+def _progress_step(run_id: str, step: int = 1, message: str = ""):
+    if JOB_STORE.step(run_id, step, message):
+        _changed(run_id)
+
+def _progress_slide(run_id: str, slide: dict):
+    """Publish a finished slide so /api/result can show it before the whole run is done."""
+    JOB_STORE.add_slide(run_id, _public_slide(slide))
+    _changed(run_id)
+
+def _public_slide(s: dict) -> dict:
+    return {"index": s["index"], "title": s["title"], "text": s["text"],
+            "image_url": s["image_url"], "thumb_url": s["thumb_url"], "image_srcset": s["image_srcset"],
+            "audio_url": s["audio_url"]}
+
+def _progress_done(run_id: str, error: str | None = None):
+    JOB_STORE.done(run_id, error)
+    _changed(run_id)
+
+def _publish_result(run_id: str, payload: dict):
+    """Expose an already finished story under run_id (e.g. one restored from the run index)."""
+    JOB_STORE.publish(run_id, payload)
+    _changed(run_id)
 
 # ======================================================
 # Prompt → connected story, longer captions (no hardcoded domain keywords)
@@ -68,111 +924,155 @@ _STOP = {
     "my","our","your","their","his","her","its","it","him","her","they","them"
 }
 
+_TOKEN_RE = re.compile(r"[^\W_]+", re.UNICODE)
+# case spelled out per letter: re.IGNORECASE on str patterns does full Unicode folding and is slower
+_CLAUSE_SPLIT_RE = re.compile(r"[.!?;:।]+|\s+(?:[Aa][Nn][Dd]|[Tt][Hh][Ee][Nn]|[Bb][Uu][Tt]|और|फिर|लेकिन)\s+")
+
 def _tokens(s: str):
-    return [w for w in re.findall(r"[^\W_]+", s, flags=re.UNICODE)]
+    return _TOKEN_RE.findall(s)
 
 def _sentences_from_prompt(prompt: str):
     # split into meaning chunks; fallback to the whole prompt
-    parts = re.split(r"[.!?;:।]+|\s+(?:and|then|but)\s+|\s+(?:और|फिर|लेकिन)\s+", prompt, flags=re.IGNORECASE)
-    parts = [p.strip() for p in parts if p and p.strip()]
+    parts = [p.strip() for p in _CLAUSE_SPLIT_RE.split(prompt) if p and p.strip()]
     return parts if parts else [prompt.strip()]
 
 def _content_spans(prompt: str, cap: int):
-    toks = [t for t in _tokens(prompt) if t.lower() not in _STOP] or _tokens(prompt)
-    spans, i = [], 0
-    while i < len(toks) and len(spans) < cap:
-        spans.append(" ".join(toks[i:i+3]))
-        i += 2
-    return [s for s in spans if s.strip()] or [prompt.strip()]
+    all_toks = _tokens(prompt)
+    toks = [t for t in all_toks if t.lower() not in _STOP] or all_toks
+    # tokens are never blank, so neither are the spans
+    return [" ".join(toks[i:i+3]) for i in range(0, min(len(toks), 2 * cap), 2)] or [prompt.strip()]
+
+class _KeywordMatcher:
+    """
+    Finds which of several keyword lists occur in a text with one regex scan. Each list keeps
+    its own priority: the earliest keyword in the list wins, wherever it appears in the text.
+    """
+
+    def __init__(self, **lists):
+        ranks = [(w, name, i) for name, words in lists.items() for i, w in enumerate(words)]
+        # the regex reports one keyword per position (the longest), so each hit also stands for
+        # every keyword that is a prefix of it
+        self._hits = {w: [(k, name, i) for k, name, i in ranks if w.startswith(k)] for w, _, _ in ranks}
+        # keywords are compiled as a trie behind a first-character class, so most positions fail
+        # on one byte; the zero-width lookahead tries every position, so overlapping keywords are all seen
+        first = "".join(sorted({re.escape(w[0]) for w in self._hits}))
+        self._re = re.compile(f"(?=[{first}])(?=({self._trie_pattern(self._hits)}))")
+
+    @classmethod
+    def _trie_pattern(cls, words) -> str:
+        trie = {}
+        for w in words:
+            node = trie
+            for ch in w:
+                node = node.setdefault(ch, {})
+            node[""] = {}
+        return cls._node_pattern(trie)
+
+    @classmethod
+    def _node_pattern(cls, node) -> str:
+        branches = [re.escape(ch) + cls._node_pattern(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+        # a keyword may end here: the longer continuation is optional and tried first
+        return f"(?:{body})?" if "" in node else body
+
+    def best(self, text: str) -> dict:
+        found = {}   # list name -> (position in list, keyword)
+        for hit in self._re.findall(text):
+            for word, name, i in self._hits[hit]:
+                if i < found.get(name, (i + 1,))[0]:
+                    found[name] = (i, word)
+        return {name: word for name, (_, word) in found.items()}
+
+_STYLE_HINTS = _KeywordMatcher(
+    time=["sunrise","dawn","morning","noon","afternoon","sunset","dusk","evening","night","twilight","moonlight","golden hour"],
+    vibe=["storm","wind","mist","fog","rain","festival","crowd","quiet","sacred","ancient","futuristic","neon","retro"],
+)
 
 def _style_from_prompt(prompt: str):
     """Very light hints (no domain tables)."""
-    p = prompt.lower()
     # time-of-day & vibe (optional hints only)
-    time = "soft light"
-    for k in ["sunrise","dawn","morning","noon","afternoon","sunset","dusk","evening","night","twilight","moonlight","golden hour"]:
-        if k in p: time = k; break
-    vibe = "calm, cinematic atmosphere"
-    for k in ["storm","wind","mist","fog","rain","festival","crowd","quiet","sacred","ancient","futuristic","neon","retro"]:
-        if k in p: vibe = f"{k} mood"; break
-    return time, vibe
+    hints = _STYLE_HINTS.best(prompt.lower())
+    vibe = hints.get("vibe")
+    return hints.get("time", "soft light"), f"{vibe} mood" if vibe else "calm, cinematic atmosphere"
 
 # ---------- Long, connected captions ----------
+# role -> sentences 2–4 of the paragraph, filled per beat from (motif, time hint, vibe)
+_PARAGRAPHS_EN = {
+    "opening": lambda motif, time, vibe: (
+        f"In {time}, the scene breathes; {motif} hangs quietly in the air while edges come into focus. "
+        "Distant sounds gather, textures settle underfoot, and the frame invites us to look a little longer. "
+        "Nothing shouts yet—only a direction begins to form, gentle but certain."),
+    "inciting": lambda motif, time, vibe: (
+        f"A small shift near {motif} breaks the stillness; something asks to be followed. "
+        "Footsteps answer, shoulders turn, and a line is crossed that cannot be uncrossed. "
+        f"The {vibe} wraps the moment with intent as the world leans forward."),
+    "rising": lambda motif, time, vibe: (
+        f"The path threads through detail; {motif} gathers weight with each breath. "
+        "Colors deepen, the camera glides closer, and every surface seems to remember a touch. "
+        "We keep moving because stopping now would mean not knowing."),
+    "midpoint": lambda motif, time, vibe: (
+        f"A new angle opens; what was hidden inside {motif} becomes legible. "
+        "Meaning lands with the quiet click of a lock, and the stakes shift under the light. "
+        "We see how far we have come, and how far we still might go."),
+    "climax": lambda motif, time, vibe: (
+        f"Energy peaks—light and motion rush around {motif} until the choice arrives, clean and bright. "
+        "Time narrows to a single breath, and the world holds still to hear the answer. "
+        "The step is taken; the scene blazes and then releases."),
+    "resolution": lambda motif, time, vibe: (
+        f"Echoes fall away; in {time}, the air loosens its grip and the colors soften. "
+        f"What remains of {motif} is simple and true, not smaller but clearer. "
+        "We carry the quiet forward like a warm stone in the pocket."),
+}
+
+_PARAGRAPHS_HI = {
+    "opening": lambda motif, time, vibe: (
+        f"{time} में दृश्य साँस लेता है; {motif} हवा में धीमे-धीमे टँगा है और किनारे साफ़ होने लगते हैं। "
+        "दूर की ध्वनियाँ जुटती हैं, सतह की बनावटें पैरों तले ठहरती हैं, और फ़्रेम हमें थोड़ी देर और देखने को कहता है। "
+        "कुछ भी चिल्लाता नहीं—सिर्फ़ एक दिशा जन्म लेती है, नरम लेकिन निश्चित।"),
+    "inciting": lambda motif, time, vibe: (
+        f"{motif} के पास एक हल्की हलचल सन्नाटा तोड़ती है; कोई इशारा बुलाता है। "
+        "कदम जवाब देते हैं, कंधे मुड़ते हैं, और एक ऐसी रेखा पार होती है जो वापस नहीं होती। "
+        f"{vibe} इस पल को मक़सद से लपेट लेती है और दुनिया थोड़ा आगे झुक जाती है।"),
+    "rising": lambda motif, time, vibe: (
+        f"रास्ता बारीक़ियों से होकर गुजरता है; {motif} हर साँस के साथ भारी होता जाता है। "
+        "रंग गाढ़े, कैमरा पास, और हर सतह जैसे स्पर्श याद कर रही हो। "
+        "हम चलते रहते हैं, क्योंकि रुकना अब ‘न जानना’ होगा।"),
+    "midpoint": lambda motif, time, vibe: (
+        f"एक नया कोण खुलता है; {motif} के भीतर छिपी परतें पढ़ी जा सकती हैं। "
+        "अर्थ ताले की धीमी क्लिक की तरह बैठता है और दाँव रोशनी में खिसकते हैं। "
+        "समझ आता है कि कितनी दूर आ चुके हैं, और कहाँ तक जा सकते हैं।"),
+    "climax": lambda motif, time, vibe: (
+        f"ऊर्जा चरम पर—रोशनी और गति {motif} के चारों ओर उमड़ पड़ती है और निर्णय उजलेपन के साथ उतरता है। "
+        "समय एक साँस में सिमटता है; दुनिया उत्तर सुनने को ठहर जाती है। "
+        "कदम उठता है; दृश्य धधकता है और फिर ढीला पड़ता है।"),
+    "resolution": lambda motif, time, vibe: (
+        f"प्रतिध्वनियाँ थमती हैं; {time} में हवा ढीली होती है और रंग नरम। "
+        f"{motif} में बचा हुआ हिस्सा सरल है, छोटा नहीं—बस साफ़। "
+        "हम इस शान्ति को जेब में रखे गर्म पत्थर की तरह साथ ले चलते हैं।"),
+}
+
 def _paragraph_en(opening: str, motif: str, role: str, time_hint: str, vibe: str) -> str:
-    s1 = f"{opening.strip().capitalize()}."
-    if role == "opening":
-        s2 = f"In {time_hint}, the scene breathes; {motif} hangs quietly in the air while edges come into focus."
-        s3 = "Distant sounds gather, textures settle underfoot, and the frame invites us to look a little longer."
-        s4 = "Nothing shouts yet—only a direction begins to form, gentle but certain."
-    elif role == "inciting":
-        s2 = f"A small shift near {motif} breaks the stillness; something asks to be followed."
-        s3 = "Footsteps answer, shoulders turn, and a line is crossed that cannot be uncrossed."
-        s4 = f"The {vibe} wraps the moment with intent as the world leans forward."
-    elif role == "rising":
-        s2 = f"The path threads through detail; {motif} gathers weight with each breath."
-        s3 = "Colors deepen, the camera glides closer, and every surface seems to remember a touch."
-        s4 = "We keep moving because stopping now would mean not knowing."
-    elif role == "midpoint":
-        s2 = f"A new angle opens; what was hidden inside {motif} becomes legible."
-        s3 = "Meaning lands with the quiet click of a lock, and the stakes shift under the light."
-        s4 = "We see how far we have come, and how far we still might go."
-    elif role == "climax":
-        s2 = f"Energy peaks—light and motion rush around {motif} until the choice arrives, clean and bright."
-        s3 = "Time narrows to a single breath, and the world holds still to hear the answer."
-        s4 = "The step is taken; the scene blazes and then releases."
-    else:  # resolution
-        s2 = f"Echoes fall away; in {time_hint}, the air loosens its grip and the colors soften."
-        s3 = f"What remains of {motif} is simple and true, not smaller but clearer."
-        s4 = "We carry the quiet forward like a warm stone in the pocket."
-    return " ".join([s1, s2, s3, s4])
+    body = _PARAGRAPHS_EN.get(role, _PARAGRAPHS_EN["resolution"])
+    return f"{opening.strip().capitalize()}. {body(motif, time_hint, vibe)}"
 
 def _paragraph_hi(opening: str, motif: str, role: str, time_hint: str, vibe: str) -> str:
-    s1 = f"{opening.strip()[0].upper() + opening.strip()[1:]}."
-    if role == "opening":
-        s2 = f"{time_hint} में दृश्य साँस लेता है; {motif} हवा में धीमे-धीमे टँगा है और किनारे साफ़ होने लगते हैं।"
-        s3 = "दूर की ध्वनियाँ जुटती हैं, सतह की बनावटें पैरों तले ठहरती हैं, और फ़्रेम हमें थोड़ी देर और देखने को कहता है।"
-        s4 = "कुछ भी चिल्लाता नहीं—सिर्फ़ एक दिशा जन्म लेती है, नरम लेकिन निश्चित।"
-    elif role == "inciting":
-        s2 = f"{motif} के पास एक हल्की हलचल सन्नाटा तोड़ती है; कोई इशारा बुलाता है।"
-        s3 = "कदम जवाब देते हैं, कंधे मुड़ते हैं, और एक ऐसी रेखा पार होती है जो वापस नहीं होती।"
-        s4 = f"{vibe} इस पल को मक़सद से लपेट लेती है और दुनिया थोड़ा आगे झुक जाती है।"
-    elif role == "rising":
-        s2 = f"रास्ता बारीक़ियों से होकर गुजरता है; {motif} हर साँस के साथ भारी होता जाता है।"
-        s3 = "रंग गाढ़े, कैमरा पास, और हर सतह जैसे स्पर्श याद कर रही हो।"
-        s4 = "हम चलते रहते हैं, क्योंकि रुकना अब ‘न जानना’ होगा।"
-    elif role == "midpoint":
-        s2 = f"एक नया कोण खुलता है; {motif} के भीतर छिपी परतें पढ़ी जा सकती हैं।"
-        s3 = "अर्थ ताले की धीमी क्लिक की तरह बैठता है और दाँव रोशनी में खिसकते हैं।"
-        s4 = "समझ आता है कि कितनी दूर आ चुके हैं, और कहाँ तक जा सकते हैं।"
-    elif role == "climax":
-        s2 = f"ऊर्जा चरम पर—रोशनी और गति {motif} के चारों ओर उमड़ पड़ती है और निर्णय उजलेपन के साथ उतरता है।"
-        s3 = "समय एक साँस में सिमटता है; दुनिया उत्तर सुनने को ठहर जाती है।"
-        s4 = "कदम उठता है; दृश्य धधकता है और फिर ढीला पड़ता है।"
-    else:  # resolution
-        s2 = f"प्रतिध्वनियाँ थमती हैं; {time_hint} में हवा ढीली होती है और रंग नरम।"
-        s3 = f"{motif} में बचा हुआ हिस्सा सरल है, छोटा नहीं—बस साफ़।"
-        s4 = "हम इस शान्ति को जेब में रखे गर्म पत्थर की तरह साथ ले चलते हैं।"
-    return " ".join([s1, s2, s3, s4])
+    opening = opening.strip()
+    body = _PARAGRAPHS_HI.get(role, _PARAGRAPHS_HI["resolution"])
+    return f"{opening[0].upper()}{opening[1:]}. {body(motif, time_hint, vibe)}"
+
+_ROLES = ("opening", "inciting", "rising", "midpoint", "climax", "resolution")
 
 def _build_long_captions(prompt: str, n: int, lang: str):
     """Return n connected paragraphs (3–5 sentences each) derived from the prompt only."""
     parts   = _sentences_from_prompt(prompt)
     spans   = _content_spans(prompt, cap=n*2)
     time_hint, vibe = _style_from_prompt(prompt)
+    paragraph = _paragraph_hi if lang.lower().startswith("hi") else _paragraph_en
 
-    def get_part(i): return parts[i % len(parts)]
-    def get_span(i): return spans[i % len(spans)]
-
-    roles = ["opening","inciting","rising","midpoint","climax","resolution"][:n]
-    paras = []
-    for i, role in enumerate(roles):
-        opening = get_part(i) if i < len(parts) else f"{prompt.strip()}"
-        motif   = get_span(i)
-        if lang.lower().startswith("hi"):
-            paras.append(_paragraph_hi(opening, motif, role, time_hint, vibe))
-        else:
-            paras.append(_paragraph_en(opening, motif, role, time_hint, vibe))
-    return paras
+    return [paragraph(parts[i] if i < len(parts) else prompt.strip(), spans[i % len(spans)], role, time_hint, vibe)
+            for i, role in enumerate(_ROLES[:n])]
 
 # ---------- Beat & image prompt builder ----------
 SHOT_STYLES = [
@@ -184,64 +1084,243 @@ SHOT_STYLES = [
     ("Resolution",     "closing wide shot, quiet composition"),
 ]
 
-def expand_prompt_into_beats(prompt: str, n_slides: int, lang: str):
-    """Build 5–6 connected beats. Image prompt is driven by the long caption to keep picture aligned."""
-    n = max(5, min(6, n_slides or 6))
+@lru_cache(maxsize=PLANNER_CACHE_SIZE)
+def _plan_beats(prompt: str, n: int, lang: str):
     captions = _build_long_captions(prompt, n, lang)
+    # Use BOTH the user prompt and the long caption to guide the image
+    return tuple(
+        (title, caption, f"{prompt}. {caption} -- {title.lower()}, {shot}, cinematic, photorealistic, highly detailed, 4k")
+        for (title, shot), caption in zip(SHOT_STYLES[:n], captions)
+    )
 
-    beats = []
-    for i, (title, shot) in enumerate(SHOT_STYLES[:n]):
-        caption = captions[i]
-        # Use BOTH the user prompt and the long caption to guide the image
-        image_prompt = (
-            f"{prompt}. {caption} "
-            f"-- {title.lower()}, {shot}, cinematic, photorealistic, highly detailed, 4k"
-        )
-        beats.append({"title": title, "text": caption, "image_prompt": image_prompt})
-    return beats
+def expand_prompt_into_beats(prompt: str, n_slides: int, lang: str):
+    """
+    Build 5–6 connected beats. Image prompt is driven by the long caption to keep picture aligned.
+    Plans are memoized per (prompt, slides, lang); callers get fresh dicts every time.
+    """
+    n = max(5, min(6, n_slides or 6))
+    return [{"title": t, "text": c, "image_prompt": ip} for t, c, ip in _plan_beats(prompt, n, lang)]
 
 # =========================
 # I/O helpers
 # =========================
 def pollinations_url(prompt):
-    return f"https://image.pollinations.ai/prompt/{quote(prompt)}?nologo=true&width=1280&height=720"
+    return f"{POLLINATIONS_BASE}/prompt/{quote(prompt)}?nologo=true&width=1280&height=720"
+
+def _make_http_session() -> "requests.Session":
+    """Keep-alive session shared by all downloads, with bounded retries and exponential backoff."""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    class CappedRetry(Retry):
+        # Retry-After is honoured, but a server asking for minutes must not park an I/O thread
+        def get_retry_after(self, response):
+            seconds = super().get_retry_after(response)
+            return None if seconds is None else min(seconds, HTTP_RETRY_MAX_WAIT)
+
+        def get_backoff_time(self):
+            return min(super().get_backoff_time(), HTTP_RETRY_MAX_WAIT)
+
+    retry = CappedRetry(
+        total=HTTP_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset(["GET"]),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=IO_CONCURRENCY, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+_HTTP = None
+_HTTP_LOCK = Lock()
+
+def http_session():
+    """The shared download session, created on first use."""
+    global _HTTP
+    if _HTTP is None:
+        with _HTTP_LOCK:
+            if _HTTP is None:
+                _HTTP = _make_http_session()
+    return _HTTP
+
+class HttpStats:
+    """Running totals for outbound downloads."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self.requests = self.errors = self.bytes = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float, nbytes: int, ok: bool):
+        with self._lock:
+            self.requests += 1
+            self.errors += 0 if ok else 1
+            self.bytes += nbytes
+            self.seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "bytes": self.bytes,
+                "avg_seconds": round(self.seconds / self.requests, 4) if self.requests else 0.0,
+                "max_seconds": round(self.max_seconds, 4),
+            }
+
+HTTP_STATS = HttpStats()
 
 def download_image(url, out_path):
-    r = requests.get(url, timeout=60); r.raise_for_status()
-    with open(out_path, "wb") as f: f.write(r.content)
+    """Stream url to disk in chunks; out_path only appears once the body is complete."""
+    t0, nbytes = time.perf_counter(), 0
+    tmp = f"{out_path}.part"
+    try:
+        with http_session().get(url, timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT), stream=True) as r:
+            r.raise_for_status()
+            with open(tmp, "wb") as f:
+                for chunk in r.iter_content(chunk_size=64 * 1024):
+                    f.write(chunk)
+                    nbytes += len(chunk)
+        os.replace(tmp, out_path)
+    except Exception:
+        HTTP_STATS.record(time.perf_counter() - t0, nbytes, ok=False)
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+    HTTP_STATS.record(time.perf_counter() - t0, nbytes, ok=True)
 
 def pick_edge_voice(lang: str, user_voice: str | None):
     if user_voice: return user_voice
     return "hi-IN-SwaraNeural" if lang.lower().startswith("hi") else "en-US-AriaNeural"
 
 async def _edge_tts_save(text: str, out_path: str, voice: str, rate: str, pitch: str):
+    import edge_tts
     communicate = edge_tts.Communicate(text, voice, rate=rate, pitch=pitch)
-    with open(out_path, "wb") as f:
-        async for chunk in communicate.stream():
-            if chunk["type"] == "audio":
-                f.write(chunk["data"])
+    tmp = f"{out_path}.part"
+    try:
+        with open(tmp, "wb") as f:
+            async for chunk in communicate.stream():
+                if chunk["type"] == "audio":
+                    f.write(chunk["data"])
+        os.replace(tmp, out_path)
+    finally:
+        try: os.remove(tmp)
+        except OSError: pass
+
+class TTSService:
+    """
+    Owns one long-lived asyncio loop on a background thread. Synchronous callers submit
+    edge-tts jobs to it; up to `concurrency` of them stream at the same time.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._lock = Lock()
+        self._loop = None
+        self._sem = None
+        self._timings = deque(maxlen=500)   # seconds per finished job
+        self.jobs = self.failures = 0
+
+    def _ensure_loop(self):
+        import asyncio
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                Thread(target=loop.run_forever, name="story-tts-loop", daemon=True).start()
+
+                async def make_semaphore():
+                    return asyncio.Semaphore(self.concurrency)
+
+                self._sem = asyncio.run_coroutine_threadsafe(make_semaphore(), loop).result()
+                self._loop = loop
+            return self._loop
+
+    async def _run(self, text, out_path, voice, rate, pitch) -> float:
+        async with self._sem:
+            t0 = time.perf_counter()
+            ok = False
+            try:
+                await _edge_tts_save(text, out_path, voice, rate, pitch)
+                ok = True
+            finally:
+                elapsed = time.perf_counter() - t0
+                with self._lock:
+                    self.jobs += 1
+                    self.failures += 0 if ok else 1
+                    self._timings.append(elapsed)
+            return elapsed
+
+    def submit(self, text, out_path, voice, rate, pitch):
+        """Queue a synthesis job; returns a concurrent.futures.Future resolving to its duration in seconds."""
+        import asyncio
+        return asyncio.run_coroutine_threadsafe(self._run(text, out_path, voice, rate, pitch), self._ensure_loop())
+
+    def synthesize(self, text, out_path, voice, rate, pitch, timeout: float | None = None) -> float:
+        fut = self.submit(text, out_path, voice, rate, pitch)
+        try:
+            return fut.result(TTS_TIMEOUT if timeout is None else timeout)
+        except BaseException:
+            fut.cancel()
+            raise
+
+    def stats(self) -> dict:
+        with self._lock:
+            timings = sorted(self._timings)
+            jobs, failures = self.jobs, self.failures
+        pick = lambda q: round(timings[min(len(timings) - 1, int(q * len(timings)))], 4) if timings else 0.0
+        return {"jobs": jobs, "failures": failures, "concurrency": self.concurrency,
+                "p50_seconds": pick(0.50), "p95_seconds": pick(0.95), "max_seconds": pick(1.0)}
+
+TTS_SERVICE = TTSService(TTS_CONCURRENCY)
+
+def _normalize_tts_text(text: str) -> str:
+    return " ".join(unicodedata.normalize("NFC", text).split())
 
 def tts_to_mp3(text, out_path, lang="en", user_voice=None):
+    """Synthesize text into out_path, reusing cached audio. Returns the engine that produced it."""
+    text = _normalize_tts_text(text)
     if EDGE_TTS_AVAILABLE:
         try:
             voice = pick_edge_voice(lang, user_voice)
             # Slightly slower for Hindi; mild lower pitch for warmth
             rate  = "-8%" if lang.lower().startswith("hi") else "-2%"
             pitch = "-2%"
-            asyncio.run(_edge_tts_save(text, out_path, voice, rate, pitch))
-            return
-        except Exception:
-            pass
-    gTTS(text=text, lang=("hi" if lang.lower().startswith("hi") else "en")).save(out_path)
+            TTS_CACHE.fetch(DiskCache.key_for("edge-tts", text, voice, rate, pitch), out_path,
+                            lambda p: TTS_SERVICE.synthesize(text, p, voice, rate, pitch))
+            return "edge-tts"
+        except Exception as e:
+            log.warning("edge-tts failed, falling back to gTTS: %s", e)
+    from gtts import gTTS
+    gtts_lang = "hi" if lang.lower().startswith("hi") else "en"
+    TTS_CACHE.fetch(DiskCache.key_for("gtts", text, gtts_lang, "", ""), out_path,
+                    lambda p: gTTS(text=text, lang=gtts_lang).save(p))
+    return "gtts"
+
+VIDEO_SIZE = (1280, 720)
 
 def build_video(slides, out_path):
+    if VIDEO_ENGINE == "ffmpeg":
+        _build_video_ffmpeg(slides, out_path)
+    else:
+        _build_video_moviepy(slides, out_path)
+
+def _build_video_moviepy(slides, out_path):
+    from moviepy.editor import ImageClip, AudioFileClip, concatenate_videoclips
     clips = []
     try:
         for s in slides:
             a = AudioFileClip(s["audio_path"])
             v = ImageClip(s["image_path"]).set_duration(a.duration).set_audio(a)
             clips.append(v)
-        video = concatenate_videoclips(clips, method="compose")
+        # every frame is normalized to VIDEO_SIZE, so clips can be chained without compositing
+        video = concatenate_videoclips(clips, method="chain")
         # Web friendly flags: faststart + yuv420p
         video.write_videofile(
             out_path,
@@ -258,80 +1337,1070 @@ def build_video(slides, out_path):
         try: video.close()  # type: ignore
         except: pass
 
+@lru_cache(maxsize=1)
+def ffmpeg_exe() -> str:
+    """Path of the bundled ffmpeg binary (found once per process)."""
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+def _ffmpeg(*args):
+    cmd = [ffmpeg_exe(), "-y", "-hide_banner", "-loglevel", "error", *args]
+    proc = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {proc.stderr.decode('utf-8', 'replace').strip()[-500:]}")
+
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+def media_duration(path) -> float:
+    """Container duration in seconds, read from ffmpeg's input probe."""
+    proc = subprocess.run([ffmpeg_exe(), "-hide_banner", "-i", path],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    m = _DURATION_RE.search(proc.stderr.decode("utf-8", "replace"))
+    if not m:
+        raise RuntimeError(f"could not read duration of {path}")
+    h, mnt, sec = m.groups()
+    return int(h) * 3600 + int(mnt) * 60 + float(sec)
+
+def encode_segment(image_path, audio_path, out_path):
+    """Encode one still + narration as an H.264/AAC clip. All segments share codec params so they concat losslessly."""
+    # -shortest overshoots with a looped still, so cut at the narration length instead
+    duration = media_duration(audio_path)
+    _ffmpeg(
+        "-loop", "1", "-framerate", str(FAST_VIDEO_FPS), "-i", image_path,
+        "-i", audio_path, "-t", f"{duration:.3f}",
+        # frames arrive pre-scaled to VIDEO_SIZE by normalize_image, so there is nothing to resize
+        "-vf", "setsar=1",
+        "-c:v", "libx264", "-preset", "veryfast", "-tune", "stillimage", "-pix_fmt", "yuv420p",
+        "-r", str(FAST_VIDEO_FPS),
+        # a keyframe on every HLS chunk boundary, so the chunks can be cut by stream copy; no B-frames,
+        # whose reorder delay (a whole second at 2 fps) would shift every cut past its keyframe
+        *(["-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})", "-bf", "0"] if HLS_ENABLED else []),
+        "-c:a", "aac", "-b:a", "128k", "-ar", "44100", "-ac", "2",
+        out_path,
+    )
+
+def split_hls_chunks(seg, out_dir, prefix) -> list:
+    """Stream-copy seg into HLS_SEGMENT_SECONDS MPEG-TS chunks; returns [(filename, seconds)]."""
+    listing = os.path.join(out_dir, f"{prefix}.csv")
+    _ffmpeg("-i", seg, "-c", "copy", "-f", "segment", "-segment_format", "mpegts",
+            "-segment_time", str(HLS_SEGMENT_SECONDS), "-segment_time_delta", "0.05",
+            "-segment_list", listing, "-segment_list_type", "csv",
+            os.path.join(out_dir, f"{prefix}_%03d.ts"))
+    try:
+        with open(listing, "r", encoding="utf-8") as f:
+            rows = [line.strip().split(",") for line in f if line.strip()]
+    finally:
+        try: os.remove(listing)
+        except OSError: pass
+    return [(name, float(end) - float(start)) for name, start, end in rows]
+
+def concat_segments(segment_paths, out_path):
+    """Join encoded segments without re-encoding; faststart keeps the result web friendly."""
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", dir=os.path.dirname(out_path), delete=False) as f:
+        for p in segment_paths:
+            escaped = os.path.abspath(p).replace("'", "'\\''")
+            f.write(f"file '{escaped}'\n")
+        list_path = f.name
+    tmp_out = f"{out_path}.{uuid.uuid4().hex[:8]}.mp4"
+    try:
+        _ffmpeg("-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", "-movflags", "+faststart", tmp_out)
+        os.replace(tmp_out, out_path)
+    finally:
+        for p in (list_path, tmp_out):
+            try: os.remove(p)
+            except OSError: pass
+
+def _build_video_ffmpeg(slides, out_path):
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(out_path)) as work:
+        segments = []
+        for s in slides:
+            seg = os.path.join(work, f"{s['index']:02d}.mp4")
+            encode_segment(s["image_path"], s["audio_path"], seg)
+            segments.append(seg)
+        concat_segments(segments, out_path)
+
 # ======================================================
-# Background worker used by async API
+# Image normalization (one decode per image, pre-scaled frames + responsive variants)
 # ======================================================
-def _generate_story_task(run_id: str, prompt: str, n_slides: int, lang: str, voice: str | None):
+def _save_atomic(img, out_path, fmt, **params):
+    """Save via a temp file so readers (and hardlinked cache entries) never see a partial write."""
+    tmp = f"{out_path}.{uuid.uuid4().hex[:8]}.tmp"
+    try:
+        img.save(tmp, fmt, **params)
+        os.replace(tmp, out_path)
+    except BaseException:
+        try: os.remove(tmp)
+        except OSError: pass
+        raise
+
+def _save_jpeg(img, out_path):
+    _save_atomic(img, out_path, "JPEG", quality=IMAGE_QUALITY, optimize=True, progressive=True)
+
+def _save_webp(img, out_path):
+    _save_atomic(img, out_path, "WEBP", quality=IMAGE_QUALITY, method=4)
+
+def normalize_image(src, out_path):
+    """Decode src once, letterbox it onto a VIDEO_SIZE RGB frame and write that to out_path as JPEG."""
+    from PIL import Image, ImageOps
+    with Image.open(src) as im:
+        im.draft("RGB", VIDEO_SIZE)   # oversized JPEGs are downscaled by libjpeg while decoding
+        im = ImageOps.exif_transpose(im).convert("RGB")
+    frame = ImageOps.pad(im, VIDEO_SIZE, Image.LANCZOS, color=(0, 0, 0))
+    _save_jpeg(frame, out_path)
+
+def image_variant_name(filename: str, width: int, fmt: str) -> str:
+    """01.jpg -> 01-640.webp; full-width variants keep the bare stem (01.webp)."""
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}.{fmt}" if width >= VIDEO_SIZE[0] else f"{stem}-{width}.{fmt}"
+
+def image_variants(filename: str) -> list:
+    """(variant filename, width, format) for the full-size WebP and each IMAGE_VARIANT_WIDTHS downscale."""
+    out = [(image_variant_name(filename, VIDEO_SIZE[0], "webp"), VIDEO_SIZE[0], "webp")]
+    for w in IMAGE_VARIANT_WIDTHS:
+        if w < VIDEO_SIZE[0]:
+            out += [(image_variant_name(filename, w, fmt), w, fmt) for fmt in ("jpg", "webp")]
+    return out
+
+def write_image_variants(out_path, frame_key: str | None = None, only: str | None = None):
     """
-    Performs generation while updating PROGRESS and saves final payload in RESULTS.
+    Cut the responsive variants of the frame at out_path next to it (just `only`, when given).
+    With frame_key they are cached with the frame, so a cache hit links them instead of encoding.
     """
+    from PIL import Image
+    folder, name = os.path.split(out_path)
+    frame = None
+
+    def produce(p, width, fmt):
+        nonlocal frame
+        if frame is None:
+            with Image.open(out_path) as im:
+                frame = im.convert("RGB")
+        img = frame if width >= VIDEO_SIZE[0] else frame.resize((width, round(width * VIDEO_SIZE[1] / VIDEO_SIZE[0])), Image.LANCZOS)
+        (_save_webp if fmt == "webp" else _save_jpeg)(img, p)
+
+    for variant, width, fmt in image_variants(name):
+        if only and variant != only:
+            continue
+        dest = os.path.join(folder, variant)
+        if frame_key:
+            IMAGE_CACHE.fetch(DiskCache.key_for(frame_key, "variant", width, fmt), dest,
+                              lambda p, width=width, fmt=fmt: produce(p, width, fmt))
+        else:
+            produce(dest, width, fmt)
+
+def image_variant_urls(base_url: str) -> dict:
+    """srcset strings for a slide image URL, one per format."""
+    folder, name = base_url.rsplit("/", 1)
+    widths = [w for w in IMAGE_VARIANT_WIDTHS if w < VIDEO_SIZE[0]] + [VIDEO_SIZE[0]]
+    return {fmt: ", ".join(f"{folder}/{image_variant_name(name, w, ext)} {w}w" for w in widths)
+            for fmt, ext in (("jpeg", "jpg"), ("webp", "webp"))}
+
+# ======================================================
+# Content-addressed media cache
+# ======================================================
+def _link_or_copy(src, dst):
+    """Hardlink src to dst (replacing dst), copying when the filesystem can't link."""
+    tmp = f"{dst}.{uuid.uuid4().hex[:8]}.tmp"
     try:
-        n = max(5, min(6, n_slides or 6))
-        # total steps = plan(1) + per-slide image+audio (2*n) + video(1)
-        total = 1 + 2 * n + 1
-        _progress_init(run_id, total, "Planning story")
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
 
-        # ---- paths
-        run_img = os.path.join(IMG_DIR, run_id); os.makedirs(run_img, exist_ok=True)
-        run_aud = os.path.join(AUDIO_DIR, run_id); os.makedirs(run_aud, exist_ok=True)
+class DiskCache:
+    """
+    Files stored under a hash key, evicted least-recently-used once the total passes max_bytes.
+    Entries are only ever replaced, never rewritten in place, so hardlinked copies stay intact.
+    Recency is kept in each entry's atime: the mtime belongs to every run file linked to the
+    entry (ETag, Last-Modified, retention age) and must not move on a hit.
+    """
 
-        # ---- plan
-        beats = expand_prompt_into_beats(prompt, n, lang)
-        _progress_step(run_id, 1, "Generating slides")
+    def __init__(self, root: str, max_bytes: int, suffix: str):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.hits = self.misses = self.evictions = 0
+        self._lock = Lock()
+        self._entries = OrderedDict()   # key -> size, least recently used first
+        self._bytes = 0
+        self._inflight = {}             # key -> (Lock, waiters)
+        os.makedirs(root, exist_ok=True)
+        self._load()
+
+    @staticmethod
+    def key_for(*parts) -> str:
+        return hashlib.sha256("\x1f".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key + self.suffix)
+
+    def _load(self):
+        found = []
+        for dirpath, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(self.suffix):
+                    continue
+                st = os.stat(os.path.join(dirpath, name))
+                found.append((st.st_atime, name[:-len(self.suffix)], st.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._bytes += size
+        with self._lock:
+            self._evict_locked()
+
+    def _evict_locked(self):
+        while self._bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            try: os.remove(self.path(key))
+            except OSError: pass
+            self._bytes -= size
+            self.evictions += 1
+
+    @contextmanager
+    def _key_lock(self, key: str):
+        with self._lock:
+            lk, waiters = self._inflight.get(key) or (Lock(), 0)
+            self._inflight[key] = (lk, waiters + 1)
+        try:
+            with lk:
+                yield
+        finally:
+            with self._lock:
+                lk, waiters = self._inflight[key]
+                if waiters == 1: del self._inflight[key]
+                else: self._inflight[key] = (lk, waiters - 1)
+
+    def get(self, key: str, out_path: str) -> bool:
+        """Materialize the entry for key at out_path; False on a miss."""
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return False
+            self._entries.move_to_end(key)
+        src = self.path(key)
+        try:
+            _link_or_copy(src, out_path)
+            # keeps LRU order across restarts; only the atime moves, linked run files keep their mtime
+            os.utime(src, ns=(time.time_ns(), os.stat(src).st_mtime_ns))
+        except OSError:
+            with self._lock:
+                size = self._entries.pop(key, None)
+                if size is not None: self._bytes -= size
+                self.misses += 1
+            return False
+        with self._lock:
+            self.hits += 1
+        return True
+
+    def put(self, key: str, src_path: str):
+        """Store src_path under key. Empty files are never cached."""
+        size = os.path.getsize(src_path)
+        if size == 0:
+            return
+        dst = self.path(key)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        _link_or_copy(src_path, dst)
+        with self._lock:
+            self._bytes += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._evict_locked()
 
-        slides = []
-        for i, b in enumerate(beats, 1):
-            # image
-            img_path = os.path.join(run_img, f"{i:02d}.jpg")
+    def fetch(self, key: str, out_path: str, produce) -> bool:
+        """
+        Write the entry for key to out_path, calling produce(out_path) and caching its output on a miss.
+        Concurrent callers with the same key wait for a single produce. Returns True on a hit.
+        """
+        with self._key_lock(key):
+            if self.get(key, out_path):
+                return True
+            produce(out_path)
+            self.put(key, out_path)
+            return False
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+IMAGE_CACHE = DiskCache(os.path.join(CACHE_DIR, "images"), IMAGE_CACHE_MB * 1024 * 1024, ".jpg")
+TTS_CACHE   = DiskCache(os.path.join(CACHE_DIR, "tts"), TTS_CACHE_MB * 1024 * 1024, ".mp3")
+
+# ======================================================
+# Concurrent slide assets (images + narration)
+# ======================================================
+_IO_POOL  = ThreadPoolExecutor(max_workers=IO_CONCURRENCY, thread_name_prefix="story-io")
+_CPU_POOL = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="story-cpu")
+
+def _fetch_image(url, out_path, metrics) -> str | None:
+    """Download (or reuse) the normalized frame for url; returns its cache key (None for the placeholder)."""
+    from PIL import Image
+
+    def produce(p):
+        raw = f"{p}.raw"
+        download_image(url, raw)
+        try:
+            with metrics.timed("normalize"):
+                normalize_image(raw, p)
+        finally:
+            os.remove(raw)
+
+    key = DiskCache.key_for(url, "frame", "%dx%d" % VIDEO_SIZE)
+    with metrics.timed("image"):
+        try:
+            # the cache holds normalized frames, so hits skip both the download and the resize
+            IMAGE_CACHE.fetch(key, out_path, produce)
+            metrics.outcome("image", "success")
+        except Exception as e:
+            log.warning("image download failed, using placeholder: %s", e)
+            _save_jpeg(Image.new("RGB", VIDEO_SIZE, (20,20,20)), out_path)
+            metrics.outcome("image", "fallback")
+            key = None
+    metrics.add_bytes("image", out_path)
+    return key
+
+def _cut_variants(out_path, frame_key, metrics):
+    """CPU-pool job: responsive variants of a ready slide image. serve_image cuts any that are missing."""
+    with metrics.timed("variants"):
+        try:
+            write_image_variants(out_path, frame_key)
+        except Exception as e:
+            log.warning("image variants failed for %s: %s", out_path, e)
+
+def _synth_audio(text, out_path, lang, voice, metrics):
+    with metrics.timed("tts"):
+        try:
+            engine = tts_to_mp3(text, out_path, lang=lang, user_voice=voice)
+            metrics.outcome("tts", "fallback" if EDGE_TTS_AVAILABLE and engine == "gtts" else "success")
+        except Exception as e:
+            log.warning("narration failed, writing an empty track: %s", e)
+            open(out_path, "wb").close()
+            metrics.outcome("tts", "error")
+    metrics.add_bytes("tts", out_path)
+
+def generate_slide_assets(run_id: str, beats, lang: str, voice: str | None, on_slide_ready=None, metrics=None):
+    """
+    Download every image and synthesize every caption in parallel on the shared I/O pool.
+    Progress advances as each job finishes; the returned slides keep beat order.
+    on_slide_ready(slide) is called as soon as a slide has both its image and its audio;
+    the image's responsive variants are cut on the CPU pool after that.
+    """
+    metrics = metrics or RunMetrics()
+    n = len(beats)
+    run_img = os.path.join(IMG_DIR, run_id); os.makedirs(run_img, exist_ok=True)
+    run_aud = os.path.join(AUDIO_DIR, run_id); os.makedirs(run_aud, exist_ok=True)
+
+    slides, jobs = [], {}
+    for i, b in enumerate(beats, 1):
+        img_path = os.path.join(run_img, f"{i:02d}.jpg")
+        aud_path = os.path.join(run_aud, f"{i:02d}.mp3")
+        slides.append({
+            "index": i,
+            "title": b["title"],
+            "text":  b["text"],
+            "image_path": img_path,
+            "audio_path": aud_path,
+            "image_url": f"/images/{run_id}/{i:02d}.jpg",
+            "thumb_url": f"/images/{run_id}/{image_variant_name(f'{i:02d}.jpg', min(IMAGE_VARIANT_WIDTHS, default=VIDEO_SIZE[0]), 'jpg')}",
+            "image_srcset": image_variant_urls(f"/images/{run_id}/{i:02d}.jpg"),
+            "audio_url": f"/audio/{run_id}/{i:02d}.mp3",
+        })
+        jobs[_IO_POOL.submit(_fetch_image, pollinations_url(b["image_prompt"]), img_path, metrics)] = (i, "image")
+        jobs[_IO_POOL.submit(_synth_audio, b["text"], aud_path, lang, voice, metrics)] = (i, "audio")
+
+    remaining, frame_keys, variant_jobs = {i: 2 for i in range(1, n + 1)}, {}, []
+    for fut in as_completed(jobs):
+        i, kind = jobs[fut]
+        result = fut.result()
+        if kind == "image":
+            frame_keys[i] = result
+        _progress_step(run_id, 1, f"Slide {i}/{n}: {kind}")
+        remaining[i] -= 1
+        if remaining[i] == 0:
+            if on_slide_ready:
+                on_slide_ready(slides[i - 1])
+            variant_jobs.append(_CPU_POOL.submit(_cut_variants, slides[i - 1]["image_path"], frame_keys[i], metrics))
+    for fut in variant_jobs:
+        fut.result()
+    return slides
+
+def render_video(slides, out_path):
+    """Run build_video on the CPU pool so concurrent runs never oversubscribe the encoder."""
+    _CPU_POOL.submit(build_video, slides, out_path).result()
+
+def _total_steps(n_slides: int) -> int:
+    n = max(5, min(6, n_slides or 6))
+    # plan(1) + per-slide image+audio (2*n) + per-slide segment encodes (n, ffmpeg engine) + video(1)
+    return 1 + 2 * n + (n if VIDEO_ENGINE == "ffmpeg" else 0) + 1
+
+class SegmentedRender:
+    """
+    Per-slide video segments for the ffmpeg engine. Each slide is encoded on the CPU pool
+    as soon as its assets exist, overlapping with the rest of the downloads and TTS.
+    With HLS enabled every segment is also cut into fixed HLS_SEGMENT_SECONDS MPEG-TS chunks,
+    appended to VIDEO_DIR/<run_id>/index.m3u8 once all earlier slides are ready, so players can
+    start early. The target duration is fixed up front, as an EVENT playlist requires.
+    """
+
+    def __init__(self, run_id: str, n_segments: int, metrics=None):
+        self.run_id = run_id
+        self.n = n_segments
+        self.metrics = metrics or RunMetrics()
+        self.dir = os.path.join(VIDEO_DIR, run_id)
+        self._jobs = {}        # slide index -> (future, segment path)
+        self._chunks = {}      # slide index -> [(ts filename, seconds)], for slides available over HLS
+        self._encoded = 0
+        self._closed = False   # set once the playlist has its ENDLIST
+        self._lock = Lock()
+        os.makedirs(self.dir, exist_ok=True)
+
+    def start(self, slide):
+        i = slide["index"]
+        seg = os.path.join(self.dir, f"{i:02d}.mp4")
+        fut = _CPU_POOL.submit(self._encode, i, slide["image_path"], slide["audio_path"], seg)
+        fut.add_done_callback(self._encoded_one)
+        self._jobs[i] = (fut, seg)
+
+    def _encode(self, i, image_path, audio_path, seg):
+        with self.metrics.timed("segment"):
             try:
-                download_image(pollinations_url(b["image_prompt"]), img_path)
+                encode_segment(image_path, audio_path, seg)
             except Exception:
-                Image.new("RGB", (1280, 720), (20,20,20)).save(img_path, "JPEG", quality=90)
-            _progress_step(run_id, 1, f"Slide {i}/{n}: image")
+                self.metrics.outcome("segment", "error")
+                raise
+        self.metrics.outcome("segment", "success")
+        if HLS_ENABLED:
+            chunks = split_hls_chunks(seg, self.dir, f"{i:02d}")
+            with self._lock:
+                self._chunks[i] = chunks
+                self._write_playlist_locked(ended=False)
+
+    def _encoded_one(self, fut):
+        if fut.exception() is not None:
+            return
+        with self._lock:
+            self._encoded += 1
+            done = self._encoded
+        _progress_step(self.run_id, 1, f"Rendering video: segment {done}/{self.n}")
+
+    def _listed_locked(self) -> list:
+        """Slides that are in the playlist: those encoded with every earlier slide."""
+        ready, i = [], 1
+        while i in self._chunks:
+            ready.append(i)
+            i += 1
+        return ready
+
+    def _write_playlist_locked(self, ended: bool):
+        if self._closed:
+            return
+        self._closed = ended
+        ready = self._listed_locked()
+        if not ready:
+            return
+        lines = ["#EXTM3U", "#EXT-X-VERSION:3", "#EXT-X-PLAYLIST-TYPE:EVENT",
+                 f"#EXT-X-TARGETDURATION:{HLS_SEGMENT_SECONDS}",
+                 "#EXT-X-MEDIA-SEQUENCE:0"]
+        for k, i in enumerate(ready):
+            if k:
+                # every slide restarts its timestamps at zero
+                lines.append("#EXT-X-DISCONTINUITY")
+            for name, seconds in self._chunks[i]:
+                lines += [f"#EXTINF:{seconds:.3f},", name]
+        if ended:
+            lines.append("#EXT-X-ENDLIST")
+        path = os.path.join(self.dir, "index.m3u8")
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(path + ".tmp", path)
 
-            # audio
-            aud_path = os.path.join(run_aud, f"{i:02d}.mp3")
+    def finish(self, out_path):
+        """Wait for every segment, then stream-copy them into out_path. On failure the run is aborted."""
+        try:
+            for fut, _ in self._jobs.values():
+                fut.result()
+            with self.metrics.timed("concat"):
+                concat_segments([self._jobs[i][1] for i in sorted(self._jobs)], out_path)
+        except BaseException:
+            self.abort()
+            raise
+        self._close()
+
+    def abort(self):
+        """
+        Give up on the video: drop encodes not yet started, wait for running ones, and end the
+        playlist where it stopped so players reach ENDLIST instead of waiting for more segments.
+        """
+        for fut, _ in self._jobs.values():
+            fut.cancel()
+        wait_futures([fut for fut, _ in self._jobs.values()])
+        self._close()
+        # chunks of slides after the first missing one never made it into the playlist
+        with self._lock:
+            listed = self._listed_locked()
+            orphans = [name for i, chunks in self._chunks.items() if i not in listed for name, _ in chunks]
+        for name in orphans:
+            try: os.remove(os.path.join(self.dir, name))
+            except OSError: pass
+
+    def _close(self):
+        if HLS_ENABLED:
+            with self._lock:
+                self._write_playlist_locked(ended=True)
+            for _, seg in self._jobs.values():
+                try: os.remove(seg)
+                except OSError: pass
+        else:
+            shutil.rmtree(self.dir, ignore_errors=True)
+
+def playlist_url(run_id: str) -> str | None:
+    if os.path.isfile(os.path.join(VIDEO_DIR, run_id, "index.m3u8")):
+        return f"/videos/{run_id}/index.m3u8"
+    return None
+
+# ======================================================
+# Job scheduling (bounded queue + fixed worker pool)
+# ======================================================
+class JobQueue:
+    """FIFO of pending runs with a hard size limit, drained by a fixed set of worker threads."""
+
+    def __init__(self, workers: int, maxsize: int):
+        self.workers = workers
+        self.maxsize = maxsize
+        self._pending = deque()   # (run_id, fn, args)
+        self._cond = Condition()
+        self._threads = []
+
+    def submit(self, run_id: str, fn, *args) -> int | None:
+        """Enqueue fn(*args); returns the 1-based queue position, or None when the queue is full."""
+        with self._cond:
+            if len(self._pending) >= self.maxsize:
+                return None
+            if not self._threads:
+                # started lazily so forked server workers each get their own threads
+                for i in range(self.workers):
+                    t = Thread(target=self._worker, name=f"story-job-{i}", daemon=True)
+                    t.start()
+                    self._threads.append(t)
+            self._pending.append((run_id, fn, args))
+            self._cond.notify()
+            return len(self._pending)
+
+    def position(self, run_id: str) -> int | None:
+        with self._cond:
+            for i, (rid, _, _) in enumerate(self._pending, 1):
+                if rid == run_id:
+                    return i
+        return None
+
+    def __len__(self):
+        with self._cond:
+            return len(self._pending)
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                run_id, fn, args = self._pending.popleft()
             try:
-                tts_to_mp3(b["text"], aud_path, lang=lang, user_voice=voice)
+                fn(*args)
             except Exception:
-                open(aud_path, "wb").close()
-            _progress_step(run_id, 1, f"Slide {i}/{n}: audio")
-
-            slides.append({
-                "index": i,
-                "title": b["title"],
-                "text":  b["text"],
-                "image_path": img_path,
-                "audio_path": aud_path,
-                "image_url": f"/images/{run_id}/{i:02d}.jpg",
-                "audio_url": f"/audio/{run_id}/{i:02d}.mp3",
-            })
+                log.exception("job %s failed", run_id)
+
+JOBS = JobQueue(JOB_WORKERS, JOB_QUEUE_SIZE)
+
+# ======================================================
+# Run deduplication (identical requests share one run)
+# ======================================================
+def _request_key(prompt: str, n_slides: int, lang: str, voice: str | None) -> str:
+    n = max(5, min(6, n_slides or 6))
+    return DiskCache.key_for("run", " ".join(prompt.split()), n, lang.lower(), voice or "")
+
+class RunIndex:
+    """
+    Request key -> run. Finished runs and in-flight claims live in the job store, so with a
+    shared store every worker dedupes against the same runs. Waiting on a claim made in this
+    process uses an Event; a claim held by another process is polled.
+    """
+    POLL_SECONDS = 0.5
+
+    def __init__(self, store: JobStore):
+        self.store = store
+        self._lock = Lock()
+        self._local = {}   # key -> (run_id, Event set when the run finishes), claims made here
+
+    @staticmethod
+    def _usable(payload: dict) -> bool:
+        # media was removed: forget it and regenerate
+        return os.path.isfile(os.path.join(VIDEO_DIR, os.path.basename(payload.get("video_url") or "")))
+
+    def begin(self, key: str, run_id: str):
+        """
+        Claim key for run_id. Returns ("done", finished_run_id), ("running", other_run_id),
+        or ("new", run_id) when the caller should generate.
+        """
+        state, rid = self.store.claim(key, run_id, self._usable)
+        if state == "new":
+            with self._lock:
+                self._local[key] = (run_id, Event())
+        return state, rid
+
+    def get(self, key: str) -> dict | None:
+        return self.store.finished(key)
+
+    def wait(self, key: str, timeout: float | None = None):
+        with self._lock:
+            entry = self._local.get(key)
+        if entry:
+            entry[1].wait(timeout)
+            return
+        deadline = None if timeout is None else time.monotonic() + timeout
+        claimant = self.store.claimant(key)
+        while claimant and self.store.claimant(key) == claimant:
+            if deadline is not None and time.monotonic() >= deadline:
+                return
+            time.sleep(self.POLL_SECONDS)
+
+    def finish(self, key: str, run_id: str, payload: dict | None):
+        """Release run_id's claim on key, remembering payload when the story is complete."""
+        self.store.release(key, run_id, payload if payload and payload.get("video_url") else None)
+        with self._lock:
+            entry = self._local.get(key)
+            if not entry or entry[0] != run_id:
+                return
+            del self._local[key]
+        entry[1].set()
+
+    def in_flight(self, run_id: str) -> bool:
+        return self.store.claimed_by(run_id)
+
+    def forget_run(self, run_id: str):
+        """Drop finished entries that point at run_id (its media is being deleted)."""
+        self.store.forget_finished(run_id)
+
+RUNS = RunIndex(JOB_STORE)
+
+# ======================================================
+# Background worker used by async API
+# ======================================================
+def _generate_story_task(run_id: str, prompt: str, n_slides: int, lang: str, voice: str | None):
+    """
+    Performs generation while updating progress and saves the final payload in JOB_STORE.
+    Releases the run's claim in RUNS when it finishes.
+    """
+    metrics, t0 = RunMetrics(), time.perf_counter()
+    segmented = None
+    try:
+        n = max(5, min(6, n_slides or 6))
+        _progress_init(run_id, _total_steps(n), "Planning story")
+
+        # ---- plan
+        with metrics.timed("plan"):
+            beats = expand_prompt_into_beats(prompt, n, lang)
+        _progress_step(run_id, 1, "Generating slides")
+
+        segmented = SegmentedRender(run_id, len(beats), metrics) if VIDEO_ENGINE == "ffmpeg" else None
+
+        def on_slide_ready(slide):
+            _progress_slide(run_id, slide)
+            if segmented:
+                segmented.start(slide)
+
+        slides = generate_slide_assets(run_id, beats, lang, voice, on_slide_ready=on_slide_ready, metrics=metrics)
 
         # ---- video
         video_url = None
+        video_path = os.path.join(VIDEO_DIR, f"{run_id}.mp4")
         try:
-            video_name = f"{run_id}.mp4"
-            _progress_step(run_id, 0, "Rendering video")
-            build_video(slides, os.path.join(VIDEO_DIR, video_name))
-            video_url = f"/videos/{video_name}"
-        except Exception:
-            pass
+            with metrics.timed("video"):
+                if segmented:
+                    segmented.finish(video_path)
+                else:
+                    _progress_step(run_id, 0, "Rendering video")
+                    render_video(slides, video_path)
+            video_url = f"/videos/{run_id}.mp4"
+            metrics.outcome("video", "success")
+            metrics.add_bytes("video", video_path)
+        except Exception as e:
+            # slides are still usable without the video
+            log.warning("video render failed for run %s: %s", run_id, e)
+            metrics.outcome("video", "error")
         _progress_step(run_id, 1, "Finalizing")
+        metrics.observe("total", time.perf_counter() - t0)
 
         # ---- store result (same shape as /api/generate)
         result_payload = {
             "run_id": run_id,
-            "slides": [{"index": s["index"], "title": s["title"], "text": s["text"],
-                        "image_url": s["image_url"], "audio_url": s["audio_url"]} for s in slides],
+            "slides": [_public_slide(s) for s in slides],
             "video_url": video_url,
+            # a failed render leaves only a truncated playlist behind
+            "playlist_url": playlist_url(run_id) if video_url else None,
             "tts_engine": "edge-tts" if EDGE_TTS_AVAILABLE else "gtts",
+            "metrics": metrics.as_dict(),
         }
-        with _LOCK:
-            RESULTS[run_id] = result_payload
+        JOB_STORE.set_result(run_id, result_payload)
 
         _progress_done(run_id, None)
+        METRICS.inc("story_runs_total", status="success")
     except Exception as e:
+        log.exception("run %s failed", run_id)
+        if segmented:
+            segmented.abort()
+        METRICS.inc("story_runs_total", status="error")
         _progress_done(run_id, str(e))
+    finally:
+        RUNS.finish(_request_key(prompt, n_slides, lang, voice), run_id, JOB_STORE.result(run_id))
+
+# ======================================================
+# Batch generation (bulk catalog builds)
+# ======================================================
+BATCH_JOBS = JobQueue(BATCH_CONCURRENCY, BATCH_QUEUE_SIZE)
+
+class BatchManager:
+    """
+    Batches of story specs. Items with the same request key share one slot (and one run);
+    slots are scheduled on BATCH_JOBS and go through RUNS like any other request, so stories
+    generated earlier or by interactive clients are reused. Assets shared between runs (same
+    image prompt, same caption and voice) come from the media caches, which produce each key once.
+    Batch records ({"items", "slots", "created_at", "finished_at"}) live in the job store, so any
+    worker sharing it can report on a batch; its slots run on the worker that accepted it.
+    """
+
+    def create(self, specs) -> str | None:
+        """Register and schedule a batch; returns its id, or None when BATCH_JOBS has no room."""
+        items, slots, by_key = [], [], {}
+        for spec in specs:
+            key = _request_key(spec["prompt"], spec["slides"], spec["lang"], spec["voice"])
+            if key not in by_key:
+                by_key[key] = len(slots)
+                slots.append({**spec, "key": key, "status": "queued", "run_id": None,
+                              "reused": False, "error": None})
+            items.append(by_key[key])
+        if len(BATCH_JOBS) + len(slots) > BATCH_QUEUE_SIZE:
+            return None
+        batch_id = f"b{uuid.uuid4().hex[:10]}"
+        JOB_STORE.put_batch(batch_id, {"items": items, "slots": slots,
+                                       "created_at": time.time(), "finished_at": None})
+        for n, _ in enumerate(slots):
+            if BATCH_JOBS.submit(batch_id, self._run_slot, batch_id, n) is None:
+                self._set(batch_id, n, status="error", error="batch queue full")
+        return batch_id
+
+    def _set(self, batch_id: str, n: int, **fields):
+        def fn(b):
+            b["slots"][n].update(fields)
+            if all(s["status"] in ("done", "error") for s in b["slots"]):
+                b["finished_at"] = time.time()
+        JOB_STORE.update_batch(batch_id, fn)
+
+    def _run_slot(self, batch_id: str, n: int):
+        b = JOB_STORE.batch(batch_id)
+        if not b:
+            return
+        slot = b["slots"][n]
+        key, uid = slot["key"], str(uuid.uuid4())[:8]
+        args = (slot["prompt"], slot["slides"], slot["lang"], slot["voice"])
+        try:
+            while True:
+                state, run_id = RUNS.begin(key, uid)
+                if state == "done":
+                    if _hand_out_done(key, run_id):
+                        return self._set(batch_id, n, status="done", run_id=run_id, reused=True)
+                    continue
+                if state != "running":
+                    break
+                # the same story is generating elsewhere; share it
+                self._set(batch_id, n, status="running", run_id=run_id, reused=True)
+                RUNS.wait(key)
+                if JOB_STORE.result(run_id):
+                    return self._set(batch_id, n, status="done")
+            _progress_init(uid, _total_steps(slot["slides"]), "Queued")
+            self._set(batch_id, n, status="running", run_id=uid)
+            _generate_story_task(uid, *args)
+            if JOB_STORE.result(uid):
+                self._set(batch_id, n, status="done")
+            else:
+                self._set(batch_id, n, status="error",
+                          error=(JOB_STORE.progress(uid) or {}).get("error") or "generation failed")
+        except Exception as e:
+            self._set(batch_id, n, status="error", error=str(e))
+
+    def status(self, batch_id: str) -> dict | None:
+        """Aggregate progress plus one entry per submitted item (duplicates point at the same run)."""
+        b = JOB_STORE.batch(batch_id)
+        if not b:
+            return None
+        items, slots = b["items"], b["slots"]
+        created_at, finished_at = b["created_at"], b["finished_at"]
+        for s in slots:
+            s["percent"] = 100 if s["status"] in ("done", "error") else 0
+            if s["status"] == "running" and s["run_id"]:
+                p = JOB_STORE.progress(s["run_id"]) or {}
+                s["percent"] = int(100.0 * p.get("current", 0) / (p.get("total") or 1))
+            s["result"] = JOB_STORE.result(s["run_id"]) if s["status"] == "done" else None
+        out, seen = [], set()
+        for i, n in enumerate(items):
+            s, r = slots[n], slots[n]["result"] or {}
+            out.append({
+                "index": i, "prompt": s["prompt"], "lang": s["lang"], "slides": s["slides"],
+                "status": s["status"], "percent": s["percent"], "run_id": s["run_id"],
+                "reused": s["reused"] or n in seen, "error": s["error"],
+                "result_url": f"/api/result/{s['run_id']}" if s["status"] == "done" else None,
+                "video_url": r.get("video_url"), "playlist_url": r.get("playlist_url"),
+            })
+            seen.add(n)
+        counts = {k: sum(1 for it in out if it["status"] == k) for k in ("queued", "running", "done", "error")}
+        return {
+            "batch_id": batch_id,
+            "status": "done" if finished_at else "running",
+            "total": len(out),
+            "unique_runs": len(slots),
+            **counts,
+            "percent": int(round(sum(it["percent"] for it in out) / len(out))) if out else 100,
+            "created_at": created_at,
+            "finished_at": finished_at,
+            "items": out,
+        }
+
+BATCHES = BatchManager()
+
+# ======================================================
+# Disk retention (images/audio/videos of finished runs)
+# ======================================================
+_RUN_ID_RE = re.compile(r"^[0-9a-f]{8}$")
+
+class RetentionManager:
+    """
+    Background sweeper that deletes whole runs (images, audio, video, HLS segments) once they
+    fall outside the configured policies. Runs that are queued, generating, deduplication
+    targets, still advertised by a live job record or pinned by a caller are never touched.
+    """
+
+    def __init__(self, max_age_hours: float, max_mb: int, keep_recent: int, interval: int):
+        self.max_age = max_age_hours * 3600
+        self.max_bytes = max_mb * 1024 * 1024
+        self.keep_recent = keep_recent
+        self.interval = interval
+        self._lock = Lock()
+        self._pins = {}   # run_id -> count
+        self._deleting = set()
+        self._thread = None
+        self.sweeps = self.runs_deleted = self.reclaimed_bytes = 0
+        self.last_sweep_at = None
+        self.last_sweep_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_age or self.max_bytes or self.keep_recent)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and self.enabled:
+                self._thread = Thread(target=self._loop, name="story-retention", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.sweep()
+            except Exception:
+                log.exception("retention sweep failed")
+
+    @contextmanager
+    def pinned(self, run_id: str):
+        """Keep run_id's files while the block runs; yields False if a sweep is already deleting them."""
+        with self._lock:
+            ok = run_id not in self._deleting
+            if ok:
+                self._pins[run_id] = self._pins.get(run_id, 0) + 1
+        try:
+            yield ok
+        finally:
+            if ok:
+                with self._lock:
+                    self._pins[run_id] -= 1
+                    if not self._pins[run_id]:
+                        del self._pins[run_id]
+
+    def _in_use(self, run_id: str) -> bool:
+        with self._lock:
+            if run_id in self._pins:
+                return True
+        if JOBS.position(run_id) is not None or RUNS.in_flight(run_id):
+            return True
+        # generating, or finished/handed out recently enough that clients may still fetch its media
+        r = JOB_STORE.snapshot(run_id)
+        return bool(r and (not r["finished_at"] or time.time() - r["finished_at"] < JOB_STORE.ttl))
+
+    @staticmethod
+    def _run_paths(run_id: str):
+        return [os.path.join(IMG_DIR, run_id), os.path.join(AUDIO_DIR, run_id),
+                os.path.join(VIDEO_DIR, run_id), os.path.join(VIDEO_DIR, f"{run_id}.mp4"),
+                os.path.join(RESULT_DIR, f"{run_id}.json")]
+
+    @staticmethod
+    def _files(path: str):
+        if os.path.isdir(path):
+            for dirpath, _, files in os.walk(path):
+                for f in files:
+                    yield os.path.join(dirpath, f)
+        elif os.path.exists(path):
+            yield path
+
+    def _scan(self):
+        """run_id -> (newest mtime, total bytes) for every run found on disk."""
+        ids = set()
+        for d in (IMG_DIR, AUDIO_DIR, VIDEO_DIR, RESULT_DIR):
+            for name in os.listdir(d):
+                rid = os.path.splitext(name)[0] if name.endswith((".mp4", ".json")) else name
+                if _RUN_ID_RE.match(rid):
+                    ids.add(rid)
+        runs = {}
+        for rid in ids:
+            newest, size = 0.0, 0
+            for p in self._run_paths(rid):
+                for f in self._files(p):
+                    try:
+                        st = os.stat(f)
+                    except OSError:
+                        continue
+                    newest = max(newest, st.st_mtime)
+                    size += st.st_size
+            runs[rid] = (newest, size)
+        return runs
+
+    def _delete(self, run_id: str):
+        RUNS.forget_run(run_id)
+        JOB_STORE.delete(run_id)
+        for p in self._run_paths(run_id):
+            if os.path.isdir(p):
+                shutil.rmtree(p, ignore_errors=True)
+            else:
+                try: os.remove(p)
+                except OSError: pass
+
+    def sweep(self) -> int:
+        """Apply the policies once; returns the number of runs deleted."""
+        t0 = time.perf_counter()
+        runs = self._scan()
+        newest_first = sorted(runs, key=lambda r: runs[r][0], reverse=True)
+        now = time.time()
+        # the keep_recent newest runs are exempt from the age and size policies too
+        kept = set(newest_first[:self.keep_recent]) if self.keep_recent else set()
+        doomed = set()
+        for rank, rid in enumerate(newest_first):
+            if rid in kept:
+                continue
+            mtime, _ = runs[rid]
+            if self.max_age and now - mtime > self.max_age:
+                doomed.add(rid)
+            if self.keep_recent and rank >= self.keep_recent:
+                doomed.add(rid)
+        if self.max_bytes:
+            total = sum(size for rid, (_, size) in runs.items() if rid not in doomed)
+            for rid in reversed(newest_first):
+                if total <= self.max_bytes:
+                    break
+                if rid not in doomed and rid not in kept and not self._in_use(rid):
+                    doomed.add(rid)
+                    total -= runs[rid][1]
+
+        deleted = reclaimed = 0
+        for rid in doomed:
+            with self._lock:
+                if rid in self._pins:
+                    continue
+                self._deleting.add(rid)   # from here on pinned() refuses rid
+            try:
+                if self._in_use(rid):
+                    continue
+                self._delete(rid)
+            finally:
+                with self._lock:
+                    self._deleting.discard(rid)
+            deleted += 1
+            reclaimed += runs[rid][1]
+        with self._lock:
+            self.sweeps += 1
+            self.runs_deleted += deleted
+            self.reclaimed_bytes += reclaimed
+            self.last_sweep_at = now
+            self.last_sweep_seconds = time.perf_counter() - t0
+        return deleted
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "sweeps": self.sweeps,
+                "runs_deleted": self.runs_deleted,
+                "reclaimed_bytes": self.reclaimed_bytes,
+                "last_sweep_at": self.last_sweep_at,
+                "last_sweep_seconds": round(self.last_sweep_seconds, 4),
+            }
+
+RETENTION = RetentionManager(RETENTION_MAX_AGE_HOURS, RETENTION_MAX_MB, RETENTION_KEEP_RECENT, RETENTION_INTERVAL)
+
+def _hand_out_done(key: str, run_id: str) -> dict | None:
+    """
+    Publish finished run_id (a dedupe hit on key) under its own run_id and return its payload.
+    The published job record keeps the files from retention for STORY_JOB_TTL; the pin covers
+    the gap until then. None when a sweep is deleting the run: the caller generates it afresh.
+    """
+    with RETENTION.pinned(run_id) as ok:
+        payload = RUNS.get(key) if ok else None
+        if payload:
+            _publish_result(run_id, payload)
+            return payload
+    RUNS.forget_run(run_id)
+    return None
+
+def warm_up() -> float:
+    """
+    Import the media stack, resolve ffmpeg and open the download session ahead of the first story.
+    Returns the seconds it took; later calls are cheap. Call it from a server hook (e.g. gunicorn's
+    post_worker_init) or set STORY_WARMUP=1 to run it in the background on a worker's first request.
+    """
+    t0 = time.perf_counter()
+    import gtts, PIL.Image
+    PIL.Image.init()   # registers every image plugin up front
+    http_session()
+    ffmpeg_exe()
+    if EDGE_TTS_AVAILABLE:
+        import edge_tts
+    if VIDEO_ENGINE != "ffmpeg":
+        import moviepy.editor
+    elapsed = time.perf_counter() - t0
+    log.info("warm-up finished in %.2fs", elapsed)
+    return elapsed
+
+_WARMUP_LOCK = Lock()
+_warmup_thread = None
+
+def start_warm_up():
+    """Run warm_up once per process on a daemon thread, so requests are never blocked by it."""
+    global _warmup_thread
+    with _WARMUP_LOCK:
+        if _warmup_thread is None:
+            _warmup_thread = Thread(target=warm_up, name="story-warmup", daemon=True)
+            _warmup_thread.start()
+
+@app.before_request
+def _start_background_services():
+    # started on the first request so every forked server worker runs its own sweeper
+    if RETENTION.enabled and RETENTION._thread is None:
+        RETENTION.start()
+    if WARMUP and _warmup_thread is None:
+        start_warm_up()
 
 # ======================================================
 # Routes (sync + async)
@@ -350,38 +2419,187 @@ def generate_async():
         return jsonify({"error": "Missing 'prompt'"}), 400
 
     run_id = str(uuid.uuid4())[:8]
+    key = _request_key(prompt, n_slides, lang, voice)
+    state, existing = RUNS.begin(key, run_id)
+    while state == "done":
+        if _hand_out_done(key, existing):
+            return jsonify({"run_id": existing, "status": "done"}), 200
+        state, existing = RUNS.begin(key, run_id)
+    if state == "running":
+        return jsonify({"run_id": existing, "status": "attached", "queue_position": JOBS.position(existing)}), 202
+
     # initialize progress so UI has immediate values
-    _progress_init(run_id, 1 + 2*max(5, min(6, n_slides)) + 1, "Queued")
-    Thread(target=_generate_story_task, args=(run_id, prompt, n_slides, lang, voice), daemon=True).start()
-    return jsonify({"run_id": run_id, "status": "started"}), 202
+    _progress_init(run_id, _total_steps(n_slides), "Queued")
+    position = JOBS.submit(run_id, _generate_story_task, run_id, prompt, n_slides, lang, voice)
+    if position is None:
+        RUNS.finish(key, run_id, None)
+        JOB_STORE.delete(run_id)
+        resp = jsonify({"error": "Too many stories in progress, try again shortly",
+                        "queue_position": JOB_QUEUE_SIZE + 1, "queue_size": JOB_QUEUE_SIZE})
+        resp.headers["Retry-After"] = "10"
+        return resp, 503
+    return jsonify({"run_id": run_id, "status": "queued", "queue_position": position}), 202
 
-@app.route("/api/progress/<run_id>", methods=["GET"])
-def progress(run_id):
-    p = PROGRESS.get(run_id)
-    if not p:
-        return jsonify({"error": "unknown run_id"}), 404
+def _progress_payload(run_id: str, p: dict) -> dict:
     percent = int(round(100.0 * p["current"] / float(p["total"] if p["total"] else 1)))
-    return jsonify({
+    position = JOBS.position(run_id)
+    return {
         "run_id": run_id,
         "current": p["current"],
         "total": p["total"],
         "percent": percent,
-        "message": p.get("message", ""),
+        "message": f"Queued (position {position})" if position else p.get("message", ""),
         "done": p.get("done", False),
         "error": p.get("error"),
-    })
+        "queue_position": position,
+    }
+
+@app.route("/api/progress/<run_id>", methods=["GET"])
+def progress(run_id):
+    p = JOB_STORE.progress(run_id)
+    if not p:
+        return jsonify({"error": "unknown run_id"}), 404
+    return jsonify(_progress_payload(run_id, p))
+
+@app.route("/api/events/<run_id>", methods=["GET"])
+def events(run_id):
+    """
+    Server-Sent Events: pushes a `progress` event on every change, a `slides` event when
+    slides become available, then a final `result` (or `error`) event and closes.
+    """
+    if not JOB_STORE.progress(run_id):
+        return jsonify({"error": "unknown run_id"}), 404
+
+    def sse(event: str, data) -> str:
+        return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    # a shared store may be updated by another process, which cannot notify us
+    wait_seconds = min(1.0, SSE_KEEPALIVE_SECONDS) if JOB_STORE.shared else SSE_KEEPALIVE_SECONDS
+
+    def stream():
+        last_seq, last_progress, last_slides, last_sent = None, None, 0, time.monotonic()
+        with _WATCH_LOCK:
+            w = _WATCHERS.setdefault(run_id, [Condition(_WATCH_LOCK), 0, 0])
+            w[1] += 1
+            seen = w[2]
+        try:
+            while True:
+                # the store read (a DB query for sqlite) stays outside the process-wide lock;
+                # local changes since then show up in w[2], so none is missed while unlocked
+                seq = JOB_STORE.seq(run_id)
+                with _WATCH_LOCK:
+                    if seq == last_seq and w[2] == seen:
+                        # sleep until the run changes; the timeout doubles as a keep-alive tick
+                        w[0].wait(wait_seconds)
+                    seen = w[2]
+                record = JOB_STORE.snapshot(run_id)
+                if record is None or not record["progress"]:
+                    yield sse("error", {"error": "unknown run_id"})
+                    return
+                last_seq, p = record["seq"], record["progress"]
+                slides = sorted(record["slides"].values(), key=lambda s: s["index"])
+                payload = _progress_payload(run_id, p)
+                if payload == last_progress and len(slides) == last_slides:
+                    if time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                        last_sent = time.monotonic()
+                        yield ": keep-alive\n\n"
+                    continue
+                last_sent = time.monotonic()
+                if payload != last_progress:
+                    yield sse("progress", payload)
+                    last_progress = payload
+                if len(slides) > last_slides:
+                    yield sse("slides", {"run_id": run_id, "slides": slides})
+                    last_slides = len(slides)
+                if p.get("done"):
+                    r = record["result"]
+                    yield sse("result", r) if r else sse("error", {"error": p.get("error") or "generation failed"})
+                    return
+        finally:
+            with _WATCH_LOCK:
+                w[1] -= 1
+                if w[1] <= 0:
+                    _WATCHERS.pop(run_id, None)
+
+    return Response(stream(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 @app.route("/api/result/<run_id>", methods=["GET"])
 def result(run_id):
-    r = RESULTS.get(run_id)
+    r = JOB_STORE.result(run_id)
     if not r:
-        # allow clients to poll until done
-        p = PROGRESS.get(run_id)
+        # allow clients to poll until done; slides finished so far are included
+        p = JOB_STORE.progress(run_id)
         if p and not p.get("done"):
-            return jsonify({"status": "pending"}), 202
+            return jsonify({"status": "pending", "run_id": run_id, "slides": JOB_STORE.slides(run_id),
+                            "video_url": None, "playlist_url": playlist_url(run_id)}), 202
         return jsonify({"status": "missing"}), 404
     return jsonify(r)
 
+@app.route("/api/batch", methods=["POST"])
+def create_batch():
+    """
+    Queue many stories at once: {"items": [{"prompt", "lang", "slides", "voice"}, ...]}.
+    Top-level "lang"/"slides"/"voice" act as defaults for every item. Returns the batch id.
+    """
+    data = request.get_json(force=True, silent=True) or {}
+    raw = data.get("items") if isinstance(data, dict) else data
+    if not isinstance(raw, list) or not raw:
+        return jsonify({"error": "Missing 'items'"}), 400
+    if len(raw) > BATCH_MAX_ITEMS:
+        return jsonify({"error": f"Too many items (max {BATCH_MAX_ITEMS})"}), 400
+    defaults = data if isinstance(data, dict) else {}
+    specs = []
+    for i, item in enumerate(raw):
+        item = {"prompt": item} if isinstance(item, str) else item
+        if not isinstance(item, dict):
+            return jsonify({"error": f"Item {i} must be an object or a prompt string"}), 400
+        prompt = (item.get("prompt") or "").strip()
+        if not prompt:
+            return jsonify({"error": f"Missing 'prompt' in item {i}"}), 400
+        specs.append({
+            "prompt": prompt,
+            "slides": int(item.get("slides") or defaults.get("slides") or 6),
+            "lang":   (item.get("lang") or defaults.get("lang") or "en").strip() or "en",
+            "voice":  (item.get("voice") or defaults.get("voice") or "").strip() or None,
+        })
+
+    batch_id = BATCHES.create(specs)
+    if batch_id is None:
+        resp = jsonify({"error": "Batch queue is full, try again later", "queue_size": BATCH_QUEUE_SIZE})
+        resp.headers["Retry-After"] = "60"
+        return resp, 503
+    status = BATCHES.status(batch_id)
+    return jsonify({"batch_id": batch_id, "status": status["status"], "total": status["total"],
+                    "unique_runs": status["unique_runs"]}), 202
+
+@app.route("/api/batch/<batch_id>", methods=["GET"])
+def batch_status(batch_id):
+    status = BATCHES.status(batch_id)
+    if not status:
+        return jsonify({"error": "unknown batch_id"}), 404
+    return jsonify(status)
+
+@app.route("/api/preview", methods=["GET", "POST"])
+def preview():
+    """
+    The story plan only (titles, captions, image prompts) with no media generated.
+    Plans are deterministic and memoized, so this is cheap enough to call on every keystroke.
+    """
+    data = (request.get_json(force=True, silent=True) if request.method == "POST" else request.args) or {}
+    prompt = (data.get("prompt") or "").strip()
+    n_slides = int(data.get("slides") or 6)
+    lang = (data.get("lang") or "en").strip() or "en"
+    if not prompt:
+        return jsonify({"error": "Missing 'prompt'"}), 400
+
+    beats = expand_prompt_into_beats(prompt, n_slides, lang)
+    resp = jsonify({"prompt": prompt, "lang": lang,
+                    "slides": [{"index": i, **b} for i, b in enumerate(beats, 1)]})
+    resp.cache_control.public = True
+    resp.cache_control.max_age = 300
+    return resp
+
 # --- Existing synchronous endpoint (kept for compatibility) ---
 @app.route("/api/generate", methods=["POST"])
 def generate():
@@ -395,117 +2613,261 @@ def generate():
         return jsonify({"error": "Missing 'prompt'"}), 400
 
     uid = str(uuid.uuid4())[:8]
-    run_img = os.path.join(IMG_DIR, uid); os.makedirs(run_img, exist_ok=True)
-    run_aud = os.path.join(AUDIO_DIR, uid); os.makedirs(run_aud, exist_ok=True)
+    key = _request_key(prompt, n_slides, lang, voice)
+    while True:
+        state, run_id = RUNS.begin(key, uid)
+        if state == "done":
+            r = _hand_out_done(key, run_id)
+            if r:
+                return jsonify(r)
+            continue
+        if state != "running":
+            break
+        # an identical story is generating; wait for it instead of duplicating the work
+        RUNS.wait(key)
+        r = JOB_STORE.result(run_id)
+        if r:
+            return jsonify(r)
 
-    beats = expand_prompt_into_beats(prompt, n_slides, lang)
-    slides = []
+    _generate_story_task(uid, prompt, n_slides, lang, voice)
+    r = JOB_STORE.result(uid)
+    if not r:
+        return jsonify({"error": (JOB_STORE.progress(uid) or {}).get("error") or "generation failed"}), 500
+    return jsonify(r)
 
-    for i, b in enumerate(beats, 1):
-        img_path = os.path.join(run_img, f"{i:02d}.jpg")
-        try:
-            download_image(pollinations_url(b["image_prompt"]), img_path)
-        except Exception:
-            Image.new("RGB", (1280, 720), (20,20,20)).save(img_path, "JPEG", quality=90)
+# --- Static media + health ---
+def _media_etag(st) -> str:
+    return f"{st.st_ino:x}-{st.st_size:x}-{int(st.st_mtime):x}"
 
-        aud_path = os.path.join(run_aud, f"{i:02d}.mp3")
-        try:
-            tts_to_mp3(b["text"], aud_path, lang=lang, user_voice=voice)
-        except Exception:
-            open(aud_path, "wb").close()
+# Block size for range bodies read from Python (servers without sendfile, multipart parts)
+_MEDIA_BLOCK = 1 << 20
+_BYTE_RANGE_RE = re.compile(r"\s*(\d*)\s*-\s*(\d*)\s*")
 
-        slides.append({
-            "index": i,
-            "title": b["title"],
-            "text":  b["text"],
-            "image_path": img_path,
-            "audio_path": aud_path,
-            "image_url": f"/images/{uid}/{i:02d}.jpg",
-            "audio_url": f"/audio/{uid}/{i:02d}.mp3",
-        })
+def _satisfiable_ranges(header: str, size: int):
+    """
+    (start, stop) byte spans of a Range header, clamped to size (suffix ranges included),
+    sorted, with overlapping or adjacent spans merged. None when the header isn't a valid
+    bytes range (it is then ignored); [] when nothing in it is satisfiable.
+    werkzeug's parser rejects overlapping or out-of-order specs outright, hence our own.
+    """
+    units, _, specs = (header or "").partition("=")
+    if units.strip().lower() != "bytes" or not specs.strip():
+        return None
+    spans = []
+    for spec in specs.split(","):
+        m = _BYTE_RANGE_RE.fullmatch(spec)
+        if not m or not (m[1] or m[2]) or (m[1] and m[2] and int(m[1]) > int(m[2])):
+            return None
+        if not m[1]:                        # bytes=-N, larger than the file means all of it
+            start, stop = max(0, size - int(m[2])), size
+        else:                               # bytes=N- / bytes=N-M
+            start, stop = int(m[1]), min(size, int(m[2]) + 1) if m[2] else size
+        if start < stop:
+            spans.append((start, stop))
+    merged = []
+    for start, stop in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], stop))
+        else:
+            merged.append((start, stop))
+    return merged
 
-    video_url = None
-    try:
-        video_name = f"{uid}.mp4"
-        build_video(slides, os.path.join(VIDEO_DIR, video_name))
-        video_url = f"/videos/{video_name}"
-    except Exception:
-        pass
+def _if_range_matches(etag: str, st) -> bool:
+    if_range = request.if_range
+    if if_range.etag:
+        return if_range.etag == etag
+    if if_range.date:
+        return int(if_range.date.timestamp()) >= int(st.st_mtime)
+    return True
 
-    return jsonify({
-        "run_id": uid,
-        "slides": [{"index": s["index"], "title": s["title"], "text": s["text"],
-                    "image_url": s["image_url"], "audio_url": s["audio_url"]} for s in slides],
-        "video_url": video_url,
-        "tts_engine": "edge-tts" if EDGE_TTS_AVAILABLE else "gtts",
-    })
+def _media_cache_headers(resp, st, immutable: bool):
+    resp.headers["Accept-Ranges"] = "bytes"
+    resp.last_modified = st.st_mtime
+    if immutable:
+        resp.cache_control.public = True
+        resp.cache_control.max_age = MEDIA_MAX_AGE
+        resp.cache_control.immutable = True
+    else:
+        resp.cache_control.no_cache = True
+    return resp
+
+class _FileSpan:
+    """
+    Read-only file limited to the bytes [start, stop). It is opened unbuffered and already
+    seeked, so a server that sendfile()s a wsgi.file_wrapper (gunicorn) sends the span straight
+    from that offset, and servers that read it instead stop at the span's end.
+    """
+    def __init__(self, path: str, start: int, stop: int):
+        self._f = open(path, "rb", buffering=0)
+        self._f.seek(start)
+        self._left = stop - start
+
+    def fileno(self) -> int:
+        return self._f.fileno()
+
+    def read(self, n: int = -1) -> bytes:
+        n = self._left if n is None or n < 0 else min(n, self._left)
+        data = self._f.read(n) if n else b""
+        self._left -= len(data)
+        return data
+
+    def close(self):
+        self._f.close()
+
+def _file_span(path: str, start: int, stop: int, size: int, ctype: str, etag: str):
+    """206 for one span, handed to the server as a seeked file with an exact Content-Length."""
+    body = wrap_file(request.environ, _FileSpan(path, start, stop), _MEDIA_BLOCK)
+    resp = Response(body, status=206, mimetype=ctype, direct_passthrough=True)
+    resp.headers["Content-Range"] = f"bytes {start}-{stop - 1}/{size}"
+    resp.headers["Content-Length"] = str(stop - start)
+    resp.set_etag(etag)
+    return resp
+
+def _multipart_ranges(path: str, spans, size: int, ctype: str, etag: str):
+    """multipart/byteranges response, each part read from the file in _MEDIA_BLOCK pieces."""
+    boundary = uuid.uuid4().hex
+    heads = [(f"--{boundary}\r\nContent-Type: {ctype}\r\n"
+              f"Content-Range: bytes {a}-{b - 1}/{size}\r\n\r\n").encode("ascii") for a, b in spans]
+    tail = f"--{boundary}--\r\n".encode("ascii")
+    length = sum(len(h) + (b - a) + 2 for h, (a, b) in zip(heads, spans)) + len(tail)
+
+    def body():
+        # WSGI servers only take bytes (gunicorn and werkzeug reject memoryviews), so each
+        # block is one read() straight into a fresh bytes object and nothing more
+        for head, (a, b) in zip(heads, spans):
+            yield head
+            part = _FileSpan(path, a, b)
+            try:
+                while block := part.read(_MEDIA_BLOCK):
+                    yield block
+            finally:
+                part.close()
+            yield b"\r\n"
+        yield tail
+
+    resp = Response(body(), status=206, mimetype=f"multipart/byteranges; boundary={boundary}")
+    resp.headers["Content-Length"] = str(length)
+    resp.set_etag(etag)
+    return resp
+
+def _send_media(directory: str, filename: str, mimetype: str | None = None, immutable: bool = True):
+    """
+    Serve a generated media file. Byte ranges are clamped and merged here. The whole file and
+    304s go through send_file; one remaining span is a seeked, length-limited file handed to
+    wsgi.file_wrapper (sendfile on gunicorn); several disjoint spans get multipart/byteranges.
+    With X-Sendfile on, single spans are left to the front server too.
+    """
+    path = safe_join(directory, filename)
+    if not path or not os.path.isfile(path):
+        return jsonify({"error": "not found"}), 404
+    st = os.stat(path)
+    etag = _media_etag(st)
+    ctype = mimetype or mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        since = request.if_modified_since
+        not_modified = since is not None and int(st.st_mtime) <= int(since.timestamp())
+    spans = _satisfiable_ranges(request.headers.get("Range"), st.st_size)
+    if spans is None or not_modified or not _if_range_matches(etag, st):
+        spans = [(0, st.st_size)]           # no usable range: a 304 or the whole file
+    if not spans:
+        resp = make_response("", 416)
+        resp.headers["Content-Range"] = f"bytes */{st.st_size}"
+        return resp
+    if len(spans) > 1:
+        return _media_cache_headers(_multipart_ranges(path, spans, st.st_size, ctype, etag), st, immutable)
+    a, b = spans[0]
+    if (a, b) != (0, st.st_size) and not USE_X_SENDFILE:
+        return _media_cache_headers(_file_span(path, a, b, st.st_size, ctype, etag), st, immutable)
+    # send_file only ever sees the one clamped span, or none for the whole file
+    if (a, b) == (0, st.st_size):
+        request.environ.pop("HTTP_RANGE", None)
+    else:
+        request.environ["HTTP_RANGE"] = f"bytes={a}-{b - 1}"
+
+    resp = send_file(path, mimetype=ctype, conditional=True, etag=etag,
+                     last_modified=st.st_mtime, max_age=MEDIA_MAX_AGE if immutable else None)
+    return _media_cache_headers(resp, st, immutable)
 
-# --- Static media + health ---
 @app.route("/images/<run_id>/<filename>")
 def serve_image(run_id, filename):
-    return send_from_directory(os.path.join(IMG_DIR, run_id), filename, as_attachment=False)
+    """
+    Slide images. `?w=<px>` picks the smallest variant at least that wide, and WebP is served to
+    clients that list image/webp in Accept (or pass `?format=webp`/`jpeg` explicitly).
+    """
+    directory = os.path.join(IMG_DIR, run_id)
+    width, fmt = request.args.get("w", type=int), request.args.get("format")
+    negotiated = fmt is None and width is not None
+    if (width or fmt) and filename.endswith(".jpg"):
+        if fmt is None:
+            fmt = "webp" if "image/webp" in request.headers.get("Accept", "") else "jpeg"
+        width = next((w for w in IMAGE_VARIANT_WIDTHS if w >= (width or VIDEO_SIZE[0])), VIDEO_SIZE[0])
+        variant = image_variant_name(filename, width, "webp" if fmt == "webp" else "jpg")
+        base = safe_join(directory, filename)
+        if (not os.path.isfile(os.path.join(directory, variant)) and _RUN_ID_RE.match(run_id)
+                and base and os.path.isfile(base)):
+            # not cut yet (the run is still generating) or a run from before variants existed
+            try:
+                write_image_variants(base, only=variant)
+            except Exception as e:
+                log.warning("image variant %s/%s failed: %s", run_id, variant, e)
+        if os.path.isfile(os.path.join(directory, variant)):
+            filename = variant
+    resp = _send_media(directory, filename)
+    if negotiated and isinstance(resp, Response):
+        resp.vary.add("Accept")
+    return resp
 
 @app.route("/audio/<run_id>/<filename>")
 def serve_audio(run_id, filename):
-    return send_from_directory(os.path.join(AUDIO_DIR, run_id), filename, as_attachment=False)
-
-def _iter_file_range(path, start, end, block_size=8192):
-    with open(path, 'rb') as f:
-        f.seek(start)
-        remaining = end - start + 1
-        while remaining > 0:
-            chunk = f.read(min(block_size, remaining))
-            if not chunk:
-                break
-            yield chunk
-            remaining -= len(chunk)
+    return _send_media(os.path.join(AUDIO_DIR, run_id), filename)
 
 @app.route("/videos/<filename>")
 def serve_video(filename):
-    # Full path & size
-    path = os.path.join(VIDEO_DIR, filename)
-    if not os.path.isfile(path):
-        return jsonify({"error": "not found"}), 404
+    return _send_media(VIDEO_DIR, filename, mimetype=mimetypes.guess_type(filename)[0] or "video/mp4")
 
-    file_size = os.path.getsize(path)
-    range_header = request.headers.get('Range', None)
+@app.route("/videos/<run_id>/<filename>")
+def serve_video_segment(run_id, filename):
+    """HLS playlist and MPEG-TS segments of a run; the playlist grows while the run is generating."""
+    if filename.endswith(".m3u8"):
+        return _send_media(os.path.join(VIDEO_DIR, run_id), filename,
+                           mimetype="application/vnd.apple.mpegurl", immutable=False)
+    return _send_media(os.path.join(VIDEO_DIR, run_id), filename, mimetype="video/mp2t")
 
-    # Default content-type
-    ctype = mimetypes.guess_type(path)[0] or 'video/mp4'
+@app.route("/api/stats")
+@app.route("/api/cache/stats")
+def cache_stats():
+    return jsonify({"images": IMAGE_CACHE.stats(), "tts": TTS_CACHE.stats(), "http": HTTP_STATS.snapshot(),
+                    "tts_service": TTS_SERVICE.stats(), "retention": RETENTION.stats(),
+                    "planner": _plan_beats.cache_info()._asdict()})
 
-    if range_header:
-        # Parse Range: bytes=start-end
-        m = re.match(r"bytes=(\d*)-(\d*)", range_header)
-        if m:
-            start_s, end_s = m.groups()
-            try:
-                start = int(start_s) if start_s else 0
-            except ValueError:
-                start = 0
-            try:
-                end = int(end_s) if end_s else file_size - 1
-            except ValueError:
-                end = file_size - 1
-
-            start = max(0, start)
-            end = min(file_size - 1, end)
-            if start > end:
-                # Invalid range
-                resp = make_response('', 416)
-                resp.headers["Content-Range"] = f"bytes */{file_size}"
-                return resp
-
-            length = (end - start) + 1
-            resp = Response(_iter_file_range(path, start, end), status=206, mimetype=ctype)
-            resp.headers.add('Content-Range', f'bytes {start}-{end}/{file_size}')
-            resp.headers.add('Accept-Ranges', 'bytes')
-            resp.headers.add('Content-Length', str(length))
-            return resp
-
-    # No Range: return whole file
-    resp = send_from_directory(VIDEO_DIR, filename, as_attachment=False, mimetype=ctype)
-    resp.headers["Accept-Ranges"] = "bytes"
-    return resp
+@app.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint: stage histograms/outcomes plus cache, HTTP, queue and TTS totals."""
+    http, tts, retention = HTTP_STATS.snapshot(), TTS_SERVICE.stats(), RETENTION.stats()
+    samples = []
+    for name, cache in (("images", IMAGE_CACHE), ("tts", TTS_CACHE)):
+        c = cache.stats()
+        samples += [
+            ("story_cache_hits_total", "counter", "Media cache hits.", {"cache": name}, c["hits"]),
+            ("story_cache_misses_total", "counter", "Media cache misses.", {"cache": name}, c["misses"]),
+            ("story_cache_evictions_total", "counter", "Media cache LRU evictions.", {"cache": name}, c["evictions"]),
+            ("story_cache_bytes", "gauge", "Bytes held by the media cache.", {"cache": name}, c["bytes"]),
+        ]
+    samples += [
+        ("story_http_requests_total", "counter", "Outbound image downloads.", {}, http["requests"]),
+        ("story_http_errors_total", "counter", "Failed outbound image downloads.", {}, http["errors"]),
+        ("story_http_bytes_total", "counter", "Bytes downloaded from the image service.", {}, http["bytes"]),
+        ("story_tts_jobs_total", "counter", "edge-tts jobs run by the TTS service.", {}, tts["jobs"]),
+        ("story_tts_failures_total", "counter", "edge-tts jobs that failed or timed out.", {}, tts["failures"]),
+        ("story_job_queue_depth", "gauge", "Runs waiting for a job worker.", {}, len(JOBS)),
+        ("story_batch_queue_depth", "gauge", "Batch items waiting for a batch worker.", {}, len(BATCH_JOBS)),
+        ("story_retention_runs_deleted_total", "counter", "Runs removed by disk retention.", {}, retention["runs_deleted"]),
+        ("story_retention_reclaimed_bytes_total", "counter", "Bytes reclaimed by disk retention.", {}, retention["reclaimed_bytes"]),
+    ]
+    return Response(METRICS.render(samples), mimetype="text/plain; version=0.0.4")
 
 @app.route("/health")
 def health():
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark for the story pipeline.
+
+Pollinations and edge-tts are replaced by local stand-in HTTP servers with configurable
+latency and payload size, the Flask app is served on a local port, and stories are
+driven through /api/generate_async at a chosen concurrency.
+
+    python bench/bench_pipeline.py --stories 12 --concurrency 4 --engine ffmpeg --out bench.json
+
+Reports per-stage p50/p95/p99 latency, throughput (stories/min), peak RSS and CPU seconds
+per story, and writes everything as JSON so runs can be compared across commits.
+"""
+import argparse, io, json, math, os, platform, resource, shutil, subprocess, sys, tempfile, threading, time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ======================================================
+# Local stand-ins
+# ======================================================
+def _fake_jpeg(n_bytes: int) -> bytes:
+    from PIL import Image
+    buf = io.BytesIO()
+    img = Image.new("RGB", (1280, 720))
+    img.putdata([(x % 256, y % 256, (x + y) % 256) for y in range(720) for x in range(1280)])
+    img.save(buf, "JPEG", quality=85)
+    data = buf.getvalue()
+    # decoders ignore bytes after the EOI marker, so pad up to the requested payload size
+    return data + b"\0" * max(0, n_bytes - len(data))
+
+def _fake_mp3(seconds: float) -> bytes:
+    import imageio_ffmpeg
+    with tempfile.TemporaryDirectory() as d:
+        out = os.path.join(d, "a.mp3")
+        subprocess.run([imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error",
+                        "-f", "lavfi", "-i", "sine=frequency=220:sample_rate=24000",
+                        "-t", f"{seconds:.2f}", "-c:a", "libmp3lame", "-b:a", "48k", out], check=True)
+        with open(out, "rb") as f:
+            return f.read()
+
+def start_stand_in(body: bytes, ctype: str, latency_ms: float):
+    """Serve `body` for every GET after `latency_ms`; returns (server, base_url)."""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            time.sleep(latency_ms / 1000.0)
+            self.send_response(200)
+            self.send_header("Content-Type", ctype)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+# ======================================================
+# Stage timing
+# ======================================================
+STAGES = {}   # stage -> [seconds]
+_STAGES_LOCK = threading.Lock()
+
+def _timed(stage: str, fn):
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with _STAGES_LOCK:
+                STAGES.setdefault(stage, []).append(time.perf_counter() - t0)
+    return wrapper
+
+def percentile(values, q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # nearest-rank percentile
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+def summarize(values) -> dict:
+    return {"count": len(values),
+            "p50": round(percentile(values, 0.50), 4),
+            "p95": round(percentile(values, 0.95), 4),
+            "p99": round(percentile(values, 0.99), 4),
+            "max": round(max(values), 4) if values else 0.0}
+
+def _rusage():
+    me, kids = resource.getrusage(resource.RUSAGE_SELF), resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {"cpu": me.ru_utime + me.ru_stime + kids.ru_utime + kids.ru_stime,
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            "rss_mb": max(me.ru_maxrss, kids.ru_maxrss) / (1024.0 * (1024 if sys.platform == "darwin" else 1))}
+
+# ======================================================
+# Driver
+# ======================================================
+def patch_app(app, tts_base: str):
+    """Point edge-tts at the stand-in and wrap the pipeline stages with timers."""
+    import aiohttp
+
+    async def fake_edge_tts_save(text, out_path, voice, rate, pitch):
+        async with aiohttp.ClientSession() as session:
+            async with session.get(f"{tts_base}/tts") as r:
+                r.raise_for_status()
+                with open(out_path, "wb") as f:
+                    async for chunk in r.content.iter_chunked(64 * 1024):
+                        f.write(chunk)
+
+    app._edge_tts_save = fake_edge_tts_save
+    app.EDGE_TTS_AVAILABLE = True
+    for stage, name in [("plan", "expand_prompt_into_beats"), ("image", "download_image"),
+                        ("tts", "tts_to_mp3"), ("video", "build_video"),
+                        ("segment", "encode_segment"), ("concat", "concat_segments")]:
+        setattr(app, name, _timed(stage, getattr(app, name)))
+
+def run_story(base: str, prompt: str, slides: int, latencies: list, errors: list):
+    import requests
+    t0 = time.perf_counter()
+    while True:
+        r = requests.post(f"{base}/api/generate_async", json={"prompt": prompt, "slides": slides}, timeout=30)
+        if r.status_code != 503:
+            break
+        time.sleep(float(r.headers.get("Retry-After", "1")))
+    if r.status_code >= 300:
+        errors.append(f"start {r.status_code}: {r.text[:200]}")
+        return
+    run_id = r.json()["run_id"]
+    while True:
+        p = requests.get(f"{base}/api/progress/{run_id}", timeout=30).json()
+        if p.get("done"):
+            break
+        time.sleep(0.05)
+    if p.get("error"):
+        errors.append(p["error"])
+        return
+    latencies.append(time.perf_counter() - t0)
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--stories", type=int, default=12)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--slides", type=int, default=6)
+    ap.add_argument("--engine", choices=["moviepy", "ffmpeg"], default="ffmpeg")
+    ap.add_argument("--image-latency-ms", type=float, default=800)
+    ap.add_argument("--image-bytes", type=int, default=150_000)
+    ap.add_argument("--tts-latency-ms", type=float, default=400)
+    ap.add_argument("--tts-seconds", type=float, default=4.0, help="length of each fake narration clip")
+    ap.add_argument("--repeat-prompts", action="store_true", help="reuse one prompt so caches/dedup are hit")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--keep-data", action="store_true", help="keep the generated media directory")
+    args = ap.parse_args()
+
+    img_server, img_base = start_stand_in(_fake_jpeg(args.image_bytes), "image/jpeg", args.image_latency_ms)
+    tts_server, tts_base = start_stand_in(_fake_mp3(args.tts_seconds), "audio/mpeg", args.tts_latency_ms)
+
+    data_dir = tempfile.mkdtemp(prefix="story-bench-")
+    os.environ.update({"STORY_DATA_DIR": data_dir, "STORY_POLLINATIONS_URL": img_base,
+                       "STORY_VIDEO_ENGINE": args.engine})
+    sys.path.insert(0, BACKEND_DIR)
+    import app as story_app
+    from werkzeug.serving import make_server
+    patch_app(story_app, tts_base)
+
+    http = make_server("127.0.0.1", 0, story_app.app, threaded=True)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{http.server_port}"
+
+    latencies, errors = [], []
+    prompts = [("A lighthouse keeper at dawn" if args.repeat_prompts else f"A lighthouse keeper at dawn, take {i}")
+               for i in range(args.stories)]
+    sem = threading.Semaphore(args.concurrency)
+
+    def worker(prompt):
+        with sem:
+            run_story(base, prompt, args.slides, latencies, errors)
+
+    before = _rusage()
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(p,)) for p in prompts]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    wall = time.perf_counter() - t0
+    after = _rusage()
+    http.shutdown(); img_server.shutdown(); tts_server.shutdown()
+
+    done = len(latencies)
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                 capture_output=True, text=True).stdout.strip() or None,
+        "python": platform.python_version(),
+        "params": vars(args),
+        "stories_completed": done,
+        "errors": errors,
+        "wall_seconds": round(wall, 3),
+        "throughput_stories_per_min": round(done / wall * 60, 3) if wall else 0.0,
+        "story_latency": summarize(latencies),
+        "stages": {k: summarize(v) for k, v in sorted(STAGES.items())},
+        "peak_rss_mb": round(after["rss_mb"], 1),
+        "cpu_seconds_per_story": round((after["cpu"] - before["cpu"]) / done, 3) if done else None,
+        "data_dir": data_dir if args.keep_data else None,
+    }
+    if not args.keep_data:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0 if not errors else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
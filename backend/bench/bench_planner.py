@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the story planner (expand_prompt_into_beats).
+
+Compares the original per-call planner, loaded from a baseline commit, with the precompiled
+planner (compiled patterns, keyword matcher, template tables) with and without its memo.
+Checks first that both produce identical beats for every prompt in the corpus.
+
+    python bench/bench_planner.py --prompts 2000 --calls 200000 --out planner.json
+
+The memoized run replays preview-style traffic, where a small share of prompts gets most
+of the requests (--hot-share of calls go to --hot prompts).
+"""
+import argparse, json, os, platform, random, re, subprocess, sys, tempfile, time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SUBJECTS = ["a lighthouse keeper", "the old banyan tree", "two friends", "a lost robot", "the river goddess",
+            "राम और सीता", "a street musician", "the last train", "a curious fox", "the temple bells"]
+SETTINGS = ["at dawn", "in the monsoon rain", "under neon signs", "through the ancient forest", "at night",
+            "during the festival", "in the quiet mist", "on a stormy sea", "at sunset", "in golden hour light"]
+TWISTS = ["finds a map", "and then a door opens", "but the wind changes", "discovers a secret",
+          "फिर रास्ता बदलता है", "meets a stranger", "and the crowd falls silent", "; everything glows"]
+
+def make_corpus(n: int, seed: int):
+    rnd = random.Random(seed)
+    out = []
+    for k in range(n):
+        prompt = f"{rnd.choice(SUBJECTS)} {rnd.choice(SETTINGS)} {rnd.choice(TWISTS)} #{k}"
+        out.append((prompt, rnd.choice([5, 6]), rnd.choice(["en", "en", "hi"])))
+    return out
+
+def load_legacy_planner(rev: str):
+    """exec the planner section of backend/app.py as it was at `rev`; returns its namespace."""
+    src = subprocess.run(["git", "show", f"{rev}:backend/app.py"], cwd=BACKEND_DIR,
+                         capture_output=True, text=True, check=True).stdout
+    start = src.index("_STOP = {")
+    end = src.index("# =========================\n# I/O helpers", start)
+    ns = {"re": re}
+    exec(compile(src[start:end], f"{rev}:backend/app.py", "exec"), ns)
+    return ns
+
+def rate(fn, calls, repeat: int = 1, setup=None) -> dict:
+    """Best of `repeat` passes over calls (setup() runs before each pass)."""
+    wall = float("inf")
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        for prompt, n, lang in calls:
+            fn(prompt, n, lang)
+        wall = min(wall, time.perf_counter() - t0)
+    return {"calls": len(calls), "seconds": round(wall, 4),
+            "calls_per_sec": round(len(calls) / wall, 1) if wall else None,
+            "us_per_call": round(wall / len(calls) * 1e6, 2) if calls else None}
+
+def main():
+    root = subprocess.run(["git", "rev-list", "--max-parents=0", "HEAD"], cwd=BACKEND_DIR,
+                          capture_output=True, text=True).stdout.split()
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--baseline", default=root[0] if root else None,
+                    help="commit holding the original planner (default: the repository's first commit)")
+    ap.add_argument("--prompts", type=int, default=2000, help="distinct prompts in the corpus")
+    ap.add_argument("--calls", type=int, default=200_000, help="calls replayed against the memoized planner")
+    ap.add_argument("--hot", type=int, default=200, help="prompts that receive most preview traffic")
+    ap.add_argument("--hot-share", type=float, default=0.9)
+    ap.add_argument("--repeat", type=int, default=5, help="timed passes per variant; the best one is reported")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--out", help="write results JSON here")
+    args = ap.parse_args()
+
+    os.environ.setdefault("STORY_DATA_DIR", tempfile.mkdtemp(prefix="story-bench-"))
+    sys.path.insert(0, BACKEND_DIR)
+    import app as story_app
+
+    legacy = load_legacy_planner(args.baseline)["expand_prompt_into_beats"]
+    plan = story_app._plan_beats.__wrapped__
+    precompiled = lambda prompt, n, lang: [{"title": t, "text": c, "image_prompt": ip} for t, c, ip in plan(prompt, n, lang)]
+
+    corpus = make_corpus(args.prompts, args.seed)
+    mismatches = [c for c in corpus if legacy(*c) != precompiled(*c)]
+
+    rnd = random.Random(args.seed + 1)
+    hot = corpus[:args.hot]
+    traffic = [rnd.choice(hot) if rnd.random() < args.hot_share else rnd.choice(corpus) for _ in range(args.calls)]
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "params": vars(args),
+        "identical_output": not mismatches,
+        "mismatches": [list(c) for c in mismatches[:5]],
+        "legacy": rate(legacy, corpus, args.repeat),
+        "precompiled": rate(precompiled, corpus, args.repeat),
+    }
+    results["legacy_preview_traffic"] = rate(legacy, traffic, args.repeat)
+    results["memoized_preview_traffic"] = rate(story_app.expand_prompt_into_beats, traffic, args.repeat,
+                                               setup=story_app._plan_beats.cache_clear)
+    results["memo"] = story_app._plan_beats.cache_info()._asdict()
+    results["speedup_precompiled"] = round(results["precompiled"]["calls_per_sec"] / results["legacy"]["calls_per_sec"], 2)
+    results["speedup_memoized"] = round(results["memoized_preview_traffic"]["calls_per_sec"]
+                                        / results["legacy_preview_traffic"]["calls_per_sec"], 2)
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0 if not mismatches else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
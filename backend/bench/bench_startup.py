@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the Flask app.
+
+Each trial boots a fresh interpreter, imports app.py and measures from process start to:
+  * import   - `import app` returned
+  * health   - the first GET /health answered
+  * enqueue  - the first POST /api/generate_async was queued (202)
+  * warm     - warm_up() finished (media libraries imported, ffmpeg found)
+
+    python bench/bench_startup.py --trials 10 --out startup.json
+
+`eager` calls warm_up() before serving, which is what importing every media library at
+module import used to cost; `lazy` serves first and warms afterwards. Both run by default.
+"""
+import argparse, json, os, platform, statistics, subprocess, sys, tempfile, time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, os, sys, time
+t0 = float(sys.argv[1])
+marks = {"interpreter": time.time() - t0}
+import app
+marks["import"] = time.time() - t0
+client = app.app.test_client()
+if sys.argv[2] == "eager":
+    app.warm_up()
+    marks["warm"] = time.time() - t0
+assert client.get("/health").status_code == 200
+marks["health"] = time.time() - t0
+r = client.post("/api/generate_async", json={"prompt": "startup probe", "slides": 5})
+assert r.status_code == 202, r.status_code
+marks["enqueue"] = time.time() - t0
+if sys.argv[2] == "lazy":
+    app.warm_up()
+    marks["warm"] = time.time() - t0
+print(json.dumps(marks), flush=True)
+os._exit(0)   # don't wait for the probe job's I/O threads
+"""
+
+def trial(mode: str, data_dir: str) -> dict:
+    env = dict(os.environ, STORY_DATA_DIR=data_dir,
+               # the probe job must not reach the real image service
+               STORY_POLLINATIONS_URL="http://127.0.0.1:9", STORY_VIDEO_ENGINE=os.environ.get("STORY_VIDEO_ENGINE", "moviepy"))
+    out = subprocess.run([sys.executable, "-c", CHILD, repr(time.time()), mode], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--trials", type=int, default=10)
+    ap.add_argument("--mode", choices=["lazy", "eager", "both"], default="both")
+    ap.add_argument("--out", help="write results JSON here")
+    args = ap.parse_args()
+
+    results = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                                 capture_output=True, text=True).stdout.strip() or None,
+        "python": platform.python_version(),
+        "params": vars(args),
+    }
+    for mode in (["lazy", "eager"] if args.mode == "both" else [args.mode]):
+        runs = []
+        for _ in range(args.trials):
+            with tempfile.TemporaryDirectory(prefix="story-bench-") as d:
+                runs.append(trial(mode, d))
+        results[mode] = {k: {"median_ms": round(statistics.median(r[k] for r in runs) * 1000, 1),
+                             "max_ms": round(max(r[k] for r in runs) * 1000, 1)}
+                         for k in runs[0]}
+
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+download_image against a local http.server standing in for the image service:
+keep-alive reuse, retries on 503 (with Retry-After capped), split connect/read
+timeouts and no .part file left behind.
+"""
+import os, sys, tempfile, time, threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+os.environ.setdefault("STORY_DATA_DIR", tempfile.mkdtemp(prefix="story-test-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+BODY = b"\xff\xd8" + bytes(range(256)) * 64
+
+class ImageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        srv = self.server
+        with srv.lock:
+            srv.hits.append((self.path, self.client_address[1]))
+            n = len(srv.hits)
+        behaviour = srv.behaviour(n, self.path)
+        if behaviour == "503":
+            self.send_response(503)
+            self.send_header("Retry-After", "120")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif behaviour == "stall":
+            time.sleep(2)
+            self.send_response(200)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+        elif behaviour == "truncate":
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY[:100])
+            self.wfile.flush()
+            self.close_connection = True
+        else:
+            self.send_response(200)
+            self.send_header("Content-Type", "image/jpeg")
+            self.send_header("Content-Length", str(len(BODY)))
+            self.end_headers()
+            self.wfile.write(BODY)
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+    srv.daemon_threads = True
+    srv.lock, srv.hits = threading.Lock(), []
+    srv.behaviour = lambda n, path: "ok"
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    srv.url = f"http://127.0.0.1:{srv.server_address[1]}"
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+@pytest.fixture
+def session(monkeypatch):
+    """A fresh shared session per test, built after any settings the test patched."""
+    monkeypatch.setattr(app, "_HTTP", None)
+    yield
+    if app._HTTP is not None:
+        app._HTTP.close()
+
+def test_connections_are_reused(server, session, tmp_path):
+    for i in range(5):
+        out = tmp_path / f"{i}.jpg"
+        app.download_image(f"{server.url}/img/{i}", str(out))
+        assert out.read_bytes() == BODY
+    assert len(server.hits) == 5
+    assert len({port for _, port in server.hits}) == 1
+
+def test_retries_on_503_with_capped_retry_after(server, session, monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "HTTP_RETRY_MAX_WAIT", 0.2)
+    server.behaviour = lambda n, path: "503" if n <= 2 else "ok"
+    out = tmp_path / "a.jpg"
+    t0 = time.monotonic()
+    app.download_image(f"{server.url}/img", str(out))
+    assert out.read_bytes() == BODY
+    assert len(server.hits) == 3
+    assert time.monotonic() - t0 < 5   # Retry-After: 120 was capped
+
+def test_gives_up_after_retry_budget(server, session, monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "HTTP_RETRIES", 2)
+    monkeypatch.setattr(app, "HTTP_RETRY_MAX_WAIT", 0)
+    server.behaviour = lambda n, path: "503"
+    out = tmp_path / "a.jpg"
+    with pytest.raises(Exception):
+        app.download_image(f"{server.url}/img", str(out))
+    assert len(server.hits) == 3
+    assert not out.exists() and not (tmp_path / "a.jpg.part").exists()
+
+def test_split_connect_and_read_timeouts(server, session, monkeypatch, tmp_path):
+    seen = []
+    real_get = app.http_session().get
+    monkeypatch.setattr(app.http_session(), "get", lambda *a, **kw: seen.append(kw["timeout"]) or real_get(*a, **kw))
+    app.download_image(f"{server.url}/img", str(tmp_path / "a.jpg"))
+    assert seen == [(app.HTTP_CONNECT_TIMEOUT, app.HTTP_READ_TIMEOUT)]
+
+    # a slow response trips the read timeout, not the (longer) connect timeout
+    monkeypatch.setattr(app, "HTTP_CONNECT_TIMEOUT", 5)
+    monkeypatch.setattr(app, "HTTP_READ_TIMEOUT", 0.3)
+    monkeypatch.setattr(app, "HTTP_RETRIES", 0)
+    monkeypatch.setattr(app, "_HTTP", None)
+    server.behaviour = lambda n, path: "stall"
+    t0 = time.monotonic()
+    with pytest.raises(Exception):
+        app.download_image(f"{server.url}/slow", str(tmp_path / "b.jpg"))
+    assert time.monotonic() - t0 < 1.5
+
+def test_truncated_body_leaves_no_part_file(server, session, tmp_path):
+    server.behaviour = lambda n, path: "truncate"
+    out = tmp_path / "a.jpg"
+    errors = app.HTTP_STATS.snapshot()["errors"]
+    with pytest.raises(Exception):
+        app.download_image(f"{server.url}/img", str(out))
+    assert not out.exists()
+    assert not (tmp_path / "a.jpg.part").exists()
+    assert app.HTTP_STATS.snapshot()["errors"] == errors + 1
+
+def test_success_leaves_only_the_final_file(server, session, tmp_path):
+    out = tmp_path / "a.jpg"
+    app.download_image(f"{server.url}/img", str(out))
+    assert sorted(os.listdir(tmp_path)) == ["a.jpg"]
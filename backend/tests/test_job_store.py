@@ -0,0 +1,112 @@
+"""
+Claim and run leases in both job stores: a live worker's heartbeat keeps them valid,
+a dead worker's claim lapses and its unfinished run is failed.
+"""
+import os, sys, json, tempfile, time
+
+import pytest
+
+os.environ.setdefault("STORY_DATA_DIR", tempfile.mkdtemp(prefix="story-test-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+LEASE = 0.4
+
+def usable(payload):
+    return True
+
+@pytest.fixture(params=["memory", "sqlite"])
+def stores(request, tmp_path):
+    """(store the run is generated in, store another worker reads it through)."""
+    if request.param == "memory":
+        s = app.MemoryJobStore(3600, lease=LEASE)
+        return s, s
+    db = str(tmp_path / "jobs.sqlite3")
+    return app.SQLiteJobStore(db, 3600, lease=LEASE), app.SQLiteJobStore(db, 3600, lease=LEASE)
+
+def start(store, key, run_id):
+    assert store.claim(key, run_id, usable) == ("new", run_id)
+    store.init(run_id, 5, "Queued")
+
+def test_heartbeat_keeps_a_live_run(stores):
+    worker, other = stores
+    start(worker, "k", "aaaa0001")
+    time.sleep(LEASE * 3)
+    assert other.claim("k", "bbbb0001", usable) == ("running", "aaaa0001")
+    assert other.claimant("k") == "aaaa0001"
+    assert other.progress("aaaa0001")["done"] is False
+    worker.set_result("aaaa0001", {"run_id": "aaaa0001"})
+    worker.done("aaaa0001", None)
+    assert worker.release("k", "aaaa0001", worker.result("aaaa0001"))
+    assert other.claim("k", "bbbb0001", usable) == ("done", "aaaa0001")
+
+def test_dead_worker_claim_lapses_and_its_run_fails(stores):
+    worker, other = stores
+    start(worker, "k", "aaaa0002")
+    worker._disown("aaaa0002")          # the worker dies: nothing renews the lease any more
+    assert other.claimant("k") == "aaaa0002"
+    time.sleep(LEASE * 1.5)
+    assert other.claimant("k") is None
+    assert not other.claimed_by("aaaa0002")
+    p = other.progress("aaaa0002")
+    assert p["done"] and p["error"]
+    assert other.claim("k", "bbbb0002", usable) == ("new", "bbbb0002")
+
+def test_waiters_stop_polling_a_dead_claim(stores, monkeypatch):
+    worker, other = stores
+    start(worker, "k", "aaaa0003")
+    worker._disown("aaaa0003")
+    runs = app.RunIndex(other)
+    monkeypatch.setattr(runs, "POLL_SECONDS", 0.05)
+    t0 = time.monotonic()
+    runs.wait("k", timeout=30)
+    assert time.monotonic() - t0 < LEASE * 3
+    assert other.result("aaaa0003") is None
+
+def test_eviction_sweep_fails_stale_runs(stores):
+    worker, other = stores
+    start(worker, "k", "aaaa0004")
+    worker._disown("aaaa0004")
+    time.sleep(LEASE * 1.5)
+    other._last_evict = 0
+    other._maybe_evict()
+    r = worker._get("aaaa0004")
+    assert r["finished_at"] and r["progress"]["error"]
+
+def finish(store, key, run_id):
+    assert store.claim(key, run_id, usable) == ("new", run_id)
+    store.release(key, run_id, {"run_id": run_id, "video_url": f"/videos/{run_id}.mp4"})
+
+def test_memory_index_keeps_run_ids_and_reads_payloads_back(tmp_path):
+    index, results = str(tmp_path / "runs_index.jsonl"), str(tmp_path / "results")
+    os.makedirs(results)
+    a = app.MemoryJobStore(3600, index, result_dir=results)
+    b = app.MemoryJobStore(3600, index, result_dir=results)     # another worker process
+    finish(a, "k1", "aaaa0005")
+    assert a._tables["keys"]["k1"] == {"run_id": "aaaa0005"}
+    assert b.finished("k1")["video_url"] == "/videos/aaaa0005.mp4"
+    assert b.claim("k1", "bbbb0005", usable) == ("done", "aaaa0005")
+    # retention deleted the run: the entry is dropped everywhere
+    os.remove(os.path.join(results, "aaaa0005.json"))
+    assert b.finished("k1") is None
+    assert a.finished("k1") is None
+    assert app._read_run_index(index) == {}
+
+def test_memory_index_compacts_and_migrates_the_legacy_file(tmp_path):
+    index, results = str(tmp_path / "runs_index.jsonl"), str(tmp_path / "results")
+    legacy = str(tmp_path / "runs_index.json")
+    os.makedirs(results)
+    with open(legacy, "w") as f:
+        json.dump({"old": {"run_id": "aaaa0006", "video_url": "/videos/aaaa0006.mp4"}}, f)
+    app._migrate_run_index(legacy, index, results)
+    assert not os.path.exists(legacy)
+    s = app.MemoryJobStore(3600, index, result_dir=results)
+    s.COMPACT_MIN = 4
+    assert s.finished("old")["run_id"] == "aaaa0006"
+    for i in range(6):
+        finish(s, f"k{i}", f"cccc000{i}")
+    for i in range(5):
+        s.forget_finished(f"cccc000{i}")
+    with open(index) as f:
+        assert len(f.readlines()) <= 4
+    assert app._read_run_index(index) == {"old": "aaaa0006", "k5": "cccc0005"}
@@ -0,0 +1,128 @@
+"""
+Media serving through the Flask test client: suffix and clamped ranges, merged
+overlaps, multipart/byteranges, 416, If-Range and 304 revalidation.
+"""
+import os, sys, tempfile
+from email.utils import formatdate
+
+import pytest
+
+os.environ.setdefault("STORY_DATA_DIR", tempfile.mkdtemp(prefix="story-test-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app  # noqa: E402
+
+DATA = bytes(range(256)) * 40      # 10240 bytes
+SIZE = len(DATA)
+
+@pytest.fixture
+def client():
+    path = os.path.join(app.VIDEO_DIR, "test-media.mp4")
+    with open(path, "wb") as f:
+        f.write(DATA)
+    os.utime(path, (1_700_000_000, 1_700_000_000))
+    yield app.app.test_client()
+    os.remove(path)
+
+def get(client, **headers):
+    return client.get("/videos/test-media.mp4", headers=headers)
+
+def test_satisfiable_ranges():
+    assert app._satisfiable_ranges("bytes=0-9", 100) == [(0, 10)]
+    assert app._satisfiable_ranges("bytes=-10", 100) == [(90, 100)]
+    assert app._satisfiable_ranges("bytes=-500", 100) == [(0, 100)]
+    assert app._satisfiable_ranges("bytes=90-500", 100) == [(90, 100)]
+    assert app._satisfiable_ranges("bytes=50-59, 0-9, 5-20, 21-30", 100) == [(0, 31), (50, 60)]
+    assert app._satisfiable_ranges("bytes=200-300", 100) == []
+    for bad in ("", "items=0-1", "bytes=", "bytes=5-1", "bytes=-", "bytes=a-b"):
+        assert app._satisfiable_ranges(bad, 100) is None
+
+def test_whole_file(client):
+    r = get(client)
+    assert r.status_code == 200
+    assert r.data == DATA
+    assert r.headers["Accept-Ranges"] == "bytes"
+    assert r.headers["ETag"]
+    assert "immutable" in r.headers["Cache-Control"]
+
+def test_single_range(client):
+    r = get(client, Range="bytes=100-199")
+    assert r.status_code == 206
+    assert r.headers["Content-Range"] == f"bytes 100-199/{SIZE}"
+    assert r.headers["Content-Length"] == "100"
+    assert r.data == DATA[100:200]
+
+@pytest.mark.parametrize("spec, start", [
+    ("bytes=-10", SIZE - 10),
+    (f"bytes={SIZE - 5}-999999", SIZE - 5),    # end clamped to the file
+], ids=["suffix", "clamped-end"])
+def test_suffix_and_clamped_ranges(client, spec, start):
+    r = get(client, Range=spec)
+    assert r.status_code == 206
+    assert r.data == DATA[start:]
+    assert r.headers["Content-Range"] == f"bytes {start}-{SIZE - 1}/{SIZE}"
+
+def test_range_covering_the_file_is_a_plain_200(client):
+    r = get(client, Range="bytes=-999999")   # suffix longer than the file
+    assert r.status_code == 200
+    assert r.data == DATA
+    assert "Content-Range" not in r.headers
+
+def test_overlapping_ranges_are_merged(client):
+    r = get(client, Range="bytes=0-99, 50-149, 150-199")
+    assert r.status_code == 206
+    assert r.mimetype == "video/mp4"
+    assert r.headers["Content-Range"] == f"bytes 0-199/{SIZE}"
+    assert r.data == DATA[:200]
+
+def test_multi_range(client):
+    r = get(client, Range="bytes=1000-1009, 0-4")
+    assert r.status_code == 206
+    assert r.mimetype == "multipart/byteranges"
+    assert int(r.headers["Content-Length"]) == len(r.data)
+    boundary = r.mimetype_params["boundary"].encode()
+    parts = r.data.split(b"--" + boundary)
+    assert parts[0] == b"" and parts[-1] == b"--\r\n"
+    bodies = []
+    for part in parts[1:-1]:
+        head, _, body = part.partition(b"\r\n\r\n")
+        assert b"Content-Type: video/mp4" in head
+        bodies.append((head.split(b"Content-Range: ")[1], body[:-2]))
+    assert bodies == [(f"bytes 0-4/{SIZE}".encode(), DATA[:5]),
+                      (f"bytes 1000-1009/{SIZE}".encode(), DATA[1000:1010])]
+
+def test_unsatisfiable_range(client):
+    r = get(client, Range=f"bytes={SIZE}-")
+    assert r.status_code == 416
+    assert r.headers["Content-Range"] == f"bytes */{SIZE}"
+
+def test_invalid_range_is_ignored(client):
+    r = get(client, Range="bytes=9-1")
+    assert r.status_code == 200
+    assert r.data == DATA
+
+def test_if_range(client):
+    etag = get(client).headers["ETag"]
+    assert get(client, Range="bytes=0-9", **{"If-Range": etag}).status_code == 206
+    r = get(client, Range="bytes=0-9", **{"If-Range": '"stale"'})
+    assert r.status_code == 200 and r.data == DATA
+    old = formatdate(1_600_000_000, usegmt=True)
+    r = get(client, Range="bytes=0-9", **{"If-Range": old})
+    assert r.status_code == 200 and r.data == DATA
+    now = formatdate(1_700_000_000, usegmt=True)
+    assert get(client, Range="bytes=0-9", **{"If-Range": now}).status_code == 206
+
+def test_not_modified(client):
+    first = get(client)
+    r = get(client, **{"If-None-Match": first.headers["ETag"]})
+    assert r.status_code == 304 and r.data == b""
+    # a matching validator wins over Range as well
+    r = get(client, Range="bytes=0-9", **{"If-None-Match": first.headers["ETag"]})
+    assert r.status_code == 304
+    r = get(client, **{"If-Modified-Since": first.headers["Last-Modified"]})
+    assert r.status_code == 304
+    r = get(client, **{"If-None-Match": '"other"'})
+    assert r.status_code == 200 and r.data == DATA
+
+def test_missing_file_and_traversal(client):
+    assert client.get("/videos/nope.mp4").status_code == 404
+    assert client.get("/audio/x/..%2F..%2Fjobs.sqlite3").status_code == 404
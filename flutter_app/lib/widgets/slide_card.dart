@@ -104,7 +104,8 @@ class _SlideCardState extends State<SlideCard> {
             child: AspectRatio(
               aspectRatio: 16 / 9,
               child: Image.network(
-                '$kApiBase${s.imageUrl}',
+                // the backend picks the smallest variant at least this many pixels wide
+                '$kApiBase${s.imageUrl}?w=${(MediaQuery.of(context).size.width * MediaQuery.of(context).devicePixelRatio).round()}',
                 fit: BoxFit.cover,
                 filterQuality: FilterQuality.medium,
                 loadingBuilder: (c, w, p) => p == null ? w : const Center(child: CircularProgressIndicator()),